@@ -1,11 +1,35 @@
 """Application detection based on domain patterns and ports"""
 
+import time
+
 import domain_patterns
 import port_mappings
+from domain_matcher import DomainMatcher
+from lookup_cache import LruCache, TtlCache
+
+# The pattern table compiled once into a single-pass matcher (keeps its priority order)
+domain_matcher = DomainMatcher(domain_patterns.DOMAIN_PATTERNS)
+
+# Domain -> app info (or None) of recently seen names; a TLS session repeats its SNI
+DOMAIN_CACHE_SIZE = 8192
+domain_cache = LruCache(DOMAIN_CACHE_SIZE)
+
+# IP address -> app info learned from SNI / DNS answers, valid for the DNS TTL
+# (clamped) or DEFAULT_IP_TTL seconds when the answer carried none
+IP_CACHE_SIZE = 50000
+DEFAULT_IP_TTL = 300
+MIN_IP_TTL = 30
+MAX_IP_TTL = 3600
+ip_to_app_cache = TtlCache(IP_CACHE_SIZE, DEFAULT_IP_TTL)
+
+_NOT_CACHED = object()
 
-# Cache for IP to application mapping (from DNS resolution)
-# This maps an IP address (e.g., "1.2.3.4") to its identified application info.
-ip_to_app_cache = {}
+# Port -> app info for every port number (None when unmapped), a flat array lookup
+MAX_PORT = 65535
+WELL_KNOWN_PORTS = 1024
+port_table = [None] * (MAX_PORT + 1)
+for _port, _app_info in port_mappings.PORT_MAPPINGS.items():
+    port_table[_port] = _app_info
 
 def identify_app_from_domain(domain):
     """
@@ -15,55 +39,92 @@ def identify_app_from_domain(domain):
     if not domain:
         return None
     domain_lower = domain.lower()
-    # Check each pattern (prioritized order)
-    for pattern, app_info in domain_patterns.DOMAIN_PATTERNS.items():
-        if pattern in domain_lower:
-            return app_info
-    return None
+    app_info = domain_cache.get(domain_lower, _NOT_CACHED)
+    if app_info is not _NOT_CACHED:
+        return app_info
+    # First pattern (prioritized order) contained in the domain
+    app_info = domain_matcher.match(domain_lower)
+    domain_cache.put(domain_lower, app_info)
+    return app_info
 
-def identify_app_from_port(port):
-    """
-    Fallback: identify application from port number.
-    Returns app info dict or None.
-    """
+def _port_number(port):
+    """Port as an int in 0..65535, or -1 when missing or invalid"""
+    if isinstance(port, int):
+        return port if 0 <= port <= MAX_PORT else -1
     if not port:
-        return None
+        return -1
     try:
         port_num = int(port)
-        return port_mappings.PORT_MAPPINGS.get(port_num)
     except (ValueError, TypeError):
-        return None
+        return -1
+    return port_num if 0 <= port_num <= MAX_PORT else -1
 
-def cache_dns_mapping(ip, domain):
+def identify_app_from_port(port, src_port=None):
+    """
+    Fallback: identify application from port numbers (int or str).
+    Checks both ports; when both are known services, a well-known port
+    (below 1024) wins over a registered one, otherwise the destination port.
+    Returns app info dict or None.
+    """
+    dst_num = _port_number(port)
+    src_num = _port_number(src_port)
+    dst_app = port_table[dst_num] if dst_num >= 0 else None
+    src_app = port_table[src_num] if src_num >= 0 else None
+    if src_app is not None and (
+            dst_app is None or (src_num < WELL_KNOWN_PORTS and dst_num >= WELL_KNOWN_PORTS)):
+        return src_app
+    return dst_app
+
+def cache_dns_mapping(ip, domain, ttl=None, now=None):
     """
     Cache the DNS query result for future lookups.
-    Maps IP address to application based on domain.
+    Maps IP address to application based on domain, for ttl seconds.
     """
     if not ip or not domain:
         return
     app_info = identify_app_from_domain(domain)
     if app_info:
         # Store the mapping in our cache
-        ip_to_app_cache[ip] = app_info
+        if ttl is not None:
+            ttl = min(max(ttl, MIN_IP_TTL), MAX_IP_TTL)
+        ip_to_app_cache.put(ip, app_info, time.time() if now is None else now, ttl)
+
+def get_app_from_ip(ip, now=None):
+    """Get cached application info from IP address, None once its TTL expired."""
+    if not ip:
+        return None
+    return ip_to_app_cache.get(ip, time.time() if now is None else now)
+
+def clear_caches():
+    """Forget cached domain and IP mappings (new capture session)."""
+    domain_cache.clear()
+    ip_to_app_cache.clear()
 
-def get_app_from_ip(ip):
-    """Get cached application info from IP address."""
-    return ip_to_app_cache.get(ip)
+def cache_stats():
+    """Hit/miss/eviction counters of the lookup caches."""
+    return {
+        "domain_cache": domain_cache.stats(),
+        "ip_cache": ip_to_app_cache.stats(),
+    }
 
 # ... (all your dictionaries and other functions remain the same) ...
 
 def detect_application(src_ip, dst_ip, dst_port,
-                       dns_query, dns_responses, sni_hostname, quic_sni):
+                       dns_query, dns_responses, sni_hostname, quic_sni,
+                       dns_ttl=None, timestamp=None, src_port=None):
     """
     Main detection function:
     Prioritizes TLS SNI, then QUIC SNI, then DNS, then IP cache, then ports.
+    dns_ttl is the TTL of the DNS answer, timestamp the packet time (epoch seconds).
+    The port fallback looks at both ports, so replies from a service are labelled too.
     """
+    now = timestamp if timestamp is not None and timestamp >= 0 else time.time()
 
     # --- STRATEGY 1: TLS SNI (For TCP/TLS traffic) ---
     if sni_hostname:
         app_info = identify_app_from_domain(sni_hostname)
         if app_info:
-            cache_dns_mapping(dst_ip, sni_hostname)
+            cache_dns_mapping(dst_ip, sni_hostname, now=now)
             return app_info
 
     # --- STRATEGY 2: QUIC SNI (For UDP/QUIC traffic) ---
@@ -71,7 +132,7 @@ def detect_application(src_ip, dst_ip, dst_port,
     if quic_sni:
         app_info = identify_app_from_domain(quic_sni)
         if app_info:
-            cache_dns_mapping(dst_ip, quic_sni)
+            cache_dns_mapping(dst_ip, quic_sni, now=now)
             return app_info
 
     # --- STRATEGY 3: DNS Query Name (Accurate, but only for DNS packets) ---
@@ -80,17 +141,17 @@ def detect_application(src_ip, dst_ip, dst_port,
         if app_info:
             if dns_responses:
                 for resp_ip in dns_responses.split(','):
-                    cache_dns_mapping(resp_ip, dns_query)
+                    cache_dns_mapping(resp_ip, dns_query, dns_ttl, now)
             return app_info
 
     # --- STRATEGY 4: Check Cached IP Mappings (Less Accurate) ---
     for ip in [dst_ip, src_ip]:
-        cached_app = get_app_from_ip(ip)
+        cached_app = get_app_from_ip(ip, now)
         if cached_app:
             return cached_app
 
     # --- STRATEGY 5: Port-based Fallback (Least Accurate) ---
-    app_info = identify_app_from_port(dst_port)
+    app_info = identify_app_from_port(dst_port, src_port)
     if app_info:
         return app_info
 
@@ -1,14 +1,21 @@
 """Packet capture and session management logic."""
 
+import os
 import re
 import socket
 import asyncio
 import subprocess
-import time
-from datetime import datetime
 import psutil
 import shared_state
 import app_detector
+import metrics_calculator
+from packet_batch import PacketBatch
+from packet_history import PacketHistory
+from flow_table import FlowTable
+from passive_dns import PassiveDns
+from rtp_tracker import RtpTracker
+from heavy_hitters import SpaceSaving
+from direction_classifier import DirectionClassifier, parse_subnets
 
 
 # Map IP protocol numbers to names -> Global Object
@@ -22,9 +29,62 @@ protocol_map = {
     "51": "ah"       # Authentication Header
 }
 
+# Bytes requested from tshark stdout per read in the background reader
+READ_CHUNK_SIZE = 256 * 1024
+
+# How long a fast replay waits for the metrics tick to drain a full ingest buffer
+REPLAY_BACKPRESSURE_DELAY = 0.05
+
+# Seconds between re-reads of the device addresses (interfaces coming and going)
+INTERFACE_REFRESH_INTERVAL = 10
+
+# Seconds the cached tshark interface list is served before a background refresh
+INTERFACE_LIST_TTL = 60
+
+# Fields extracted by tshark, in record order. Consumers index records by position,
+# so new fields must only ever be appended.
+TSHARK_FIELDS = [
+    "frame.number",                            # 0
+    "frame.time_epoch",                        # 1
+    "ip.src",                                  # 2
+    "ip.dst",                                  # 3
+    "frame.len",                               # 4
+    "_ws.col.Protocol",                        # 5
+    "_ws.col.Info",                            # 6
+    "tcp.stream",                              # 7
+    "udp.stream",                              # 8
+    "tcp.analysis.ack_rtt",                    # 9
+    "tcp.analysis.retransmission",             # 10
+    "tcp.analysis.fast_retransmission",        # 11
+    "tcp.analysis.spurious_retransmission",    # 12
+    "rtp.ssrc",                                # 13
+    "rtp.seq",                                 # 14
+    "ip.proto",                                # 15
+    "ipv6.src",                                # 16
+    "ipv6.dst",                                # 17
+    "rtp.timestamp",                           # 18
+    "rtp.p_type",                              # 19
+    "ipv6.nxt",                                # 20
+    "tcp.len",                                 # 21
+    "udp.length",                              # 22
+    "tcp.srcport",                             # 23
+    "tcp.dstport",                             # 24
+    "udp.srcport",                             # 25
+    "udp.dstport",                             # 26
+    "dns.qry.name",                            # 27
+    "dns.a",                                   # 28
+    "dns.aaaa",                                # 29
+    "tls.handshake.extensions_server_name",    # 30
+    "gquic.tag.sni",                           # 31
+    "dns.resp.ttl",                            # 32
+]
+
 
 def get_device_ips():
-    """Get all IPv4 and IPv6 addresses from all network interfaces."""
+    """
+    Get all IPv4 and IPv6 addresses from all network interfaces and rebuild the
+    direction classifier. Returns True when the address set changed.
+    """
     device_ips = []
     ipv4_list = []
     ipv6_list = []
@@ -47,11 +107,75 @@ def get_device_ips():
         ipv4_list = list(set(ipv4_list))
         ipv6_list = list(set(ipv6_list))
 
+        changed = (set(ipv4_list) != set(shared_state.ipv4_ips) or
+                   set(ipv6_list) != set(shared_state.ipv6_ips))
+
         shared_state.ip_address = device_ips
         shared_state.ipv4_ips = ipv4_list
         shared_state.ipv6_ips = ipv6_list
+
+        if changed or not shared_state.direction_classifier.hosts:
+            shared_state.direction_classifier = DirectionClassifier(
+                ipv4_list, ipv6_list, parse_subnets(os.getenv("LOCAL_SUBNETS", ""))
+            )
+        return changed
     except (psutil.Error, OSError) as e:
         print(f"Error getting device IPs: {e}")
+        return False
+
+
+async def interface_watch_loop():
+    """
+    Re-read the device addresses periodically so direction detection follows
+    interface changes, and refresh the cached interface list when they change.
+    """
+    await refresh_interfaces()
+    while True:
+        await asyncio.sleep(INTERFACE_REFRESH_INTERVAL)
+        if get_device_ips():
+            print(f"Device addresses changed: {len(shared_state.ip_address)} addresses")
+            invalidate_interfaces()
+            await refresh_interfaces()
+
+
+def invalidate_interfaces():
+    """Mark the cached interface list stale, the next request re-runs tshark -D"""
+    shared_state.interfaces_cached_at = None
+    shared_state.interfaces_refresh_task = None
+
+
+def refresh_interfaces():
+    """
+    Re-read the interface list in a worker thread, so tshark -D never blocks the
+    event loop. Concurrent callers share the same refresh task.
+    """
+    task = shared_state.interfaces_refresh_task
+    if task is None or task.done():
+        task = asyncio.create_task(_refresh_interfaces())
+        shared_state.interfaces_refresh_task = task
+    return task
+
+
+async def _refresh_interfaces():
+    """Run tshark -D off the event loop and cache the result"""
+    interfaces = await asyncio.to_thread(get_network_interfaces)
+    shared_state.interfaces_cache = interfaces
+    shared_state.interfaces_cached_at = asyncio.get_running_loop().time()
+    return interfaces
+
+
+async def get_cached_interfaces():
+    """
+    Interface list for clients. Served from the cache; a stale list is returned
+    as is while it is refreshed in the background, only an empty cache waits.
+    """
+    if shared_state.interfaces_cache is None:
+        return await refresh_interfaces()
+
+    cached_at = shared_state.interfaces_cached_at
+    if cached_at is None or asyncio.get_running_loop().time() - cached_at > INTERFACE_LIST_TTL:
+        refresh_interfaces()
+    return shared_state.interfaces_cache
 
 
 def get_network_interfaces():
@@ -88,58 +212,23 @@ def get_network_interfaces():
 
 
 
-async def start_tshark(interface = "1"):
-    """Start tshark with the specified interface (number or name)"""
+def build_tshark_command(source_args):
+    """Build the tshark field-extraction command for a live or file source"""
+    tshark_cmd = ["tshark", *source_args, "-T", "fields", "-l"]
+    for field in TSHARK_FIELDS:
+        tshark_cmd.extend(["-e", field])
+    tshark_cmd.extend([
+        "-E", "separator=|",
+        "-E", "occurrence=f",
+        "-E", "header=n",
+        "-E", "quote=n"
+    ])
+    return tshark_cmd
 
-    if shared_state.tshark_proc is not None:
-        return False, "Tshark already running"
 
+async def launch_tshark(tshark_cmd, source_label):
+    """Spawn tshark and start the background reader. Returns (success, message)."""
     try:
-        print(f"Starting tshark on interface: {interface}")
-
-        tshark_cmd = [
-            "tshark",
-            "-i", str(interface),
-            "-T", "fields",
-            "-l",
-            "-e", "frame.number",
-            "-e", "frame.time_epoch",
-            "-e", "ip.src",
-            "-e", "ip.dst",
-            "-e", "frame.len",
-            "-e", "_ws.col.Protocol",
-            "-e", "_ws.col.Info",
-            "-e", "tcp.stream",
-            "-e", "udp.stream",
-            "-e", "tcp.analysis.ack_rtt",
-            "-e", "tcp.analysis.retransmission",
-            "-e", "tcp.analysis.fast_retransmission",
-            "-e", "tcp.analysis.spurious_retransmission",
-            "-e", "rtp.ssrc",
-            "-e", "rtp.seq",
-            "-e", "ip.proto",
-            "-e", "ipv6.src",
-            "-e", "ipv6.dst",
-            "-e", "rtp.timestamp",
-            "-e", "rtp.p_type",
-            "-e", "ipv6.nxt",
-            "-e", "tcp.len",
-            "-e", "udp.length",
-            "-e", "tcp.srcport",
-            "-e", "tcp.dstport",
-            "-e", "udp.srcport",
-            "-e", "udp.dstport",
-            "-e", "dns.qry.name",
-            "-e", "dns.a",
-            "-e", "dns.aaaa",
-            "-e", "tls.handshake.extensions_server_name",
-            "-e", "gquic.tag.sni",
-            "-E", "separator=|",
-            "-E", "occurrence=f",
-            "-E", "header=n",
-            "-E", "quote=n"
-        ]
-
         # Create async subprocess
         shared_state.tshark_proc = await asyncio.create_subprocess_exec(
             *tshark_cmd,
@@ -150,7 +239,8 @@ async def start_tshark(interface = "1"):
         # Wait a bit and check if process started
         await asyncio.sleep(0.2)
 
-        if shared_state.tshark_proc.returncode is not None:
+        # A short capture file can legitimately be fully read already (exit code 0)
+        if shared_state.tshark_proc.returncode not in (None, 0):
             try:
                 stderr_output = await asyncio.wait_for(
                     shared_state.tshark_proc.stderr.read(),
@@ -161,11 +251,12 @@ async def start_tshark(interface = "1"):
             except (asyncio.TimeoutError, asyncio.CancelledError, UnicodeDecodeError) as e:
                 error_msg = e
             shared_state.tshark_proc = None
-            return False, f"Failed to start tshark on interface {interface}: {error_msg}"
+            return False, f"Failed to start tshark on {source_label}: {error_msg}"
 
         shared_state.capture_active = True
-        print(f"Tshark started successfully on interface {interface}")
-        return True, f"Tshark started on interface {interface}"
+        shared_state.reader_task = asyncio.create_task(tshark_reader_loop())
+        print(f"Tshark started successfully on {source_label}")
+        return True, f"Tshark started on {source_label}"
 
     except FileNotFoundError:
         print("Tshark not found. Please install Wireshark/tshark.")
@@ -177,14 +268,70 @@ async def start_tshark(interface = "1"):
         return False, f"Error starting tshark: {e}"
 
 
+async def start_tshark(interface = "1"):
+    """Start tshark with the specified interface (number or name)"""
+
+    if shared_state.tshark_proc is not None:
+        return False, "Tshark already running"
+
+    print(f"Starting tshark on interface: {interface}")
+
+    shared_state.capture_source = "interface"
+    shared_state.replay_paced = False
+    return await launch_tshark(
+        build_tshark_command(["-i", str(interface)]),
+        f"interface {interface}"
+    )
+
+
+async def start_replay(file_path, paced = False):
+    """
+    Replay a pcap/pcapng file through the same pipeline as a live capture.
+    With paced=True packets are released following their frame.time_epoch spacing,
+    otherwise the file is read as fast as the pipeline can ingest it.
+    """
+
+    if shared_state.tshark_proc is not None:
+        return False, "Tshark already running"
+
+    if not file_path or not os.path.isfile(file_path):
+        return False, f"Capture file not found: {file_path}"
+
+    mode = "paced" if paced else "as fast as possible"
+    print(f"Starting replay of {file_path} ({mode})")
+
+    shared_state.capture_source = "file"
+    shared_state.replay_paced = bool(paced)
+    shared_state.replay_clock = None
+    shared_state.replay_finished = False
+    return await launch_tshark(
+        build_tshark_command(["-r", file_path]),
+        f"file {os.path.basename(file_path)}"
+    )
+
+
 def reset_shared_state():
     """Reset all shared capture-related state variables."""
+    app_detector.clear_caches()
     shared_state.tshark_proc = None
     shared_state.capture_active = False
     shared_state.session_start_time = None
+    shared_state.capture_source = None
+    shared_state.replay_paced = False
+    shared_state.replay_clock = None
+    shared_state.replay_finished = False
 
+    shared_state.packet_batch = PacketBatch()
     shared_state.streams = {}
-    shared_state.all_packets_history = []
+    shared_state.ingest_batch = PacketBatch()
+    shared_state.ingest_streams = {}
+    shared_state.ingest_dropped_packets = 0
+    shared_state.ingest_metrics = new_metrics_accumulator()
+    shared_state.window_metrics = None
+    shared_state.packet_history = PacketHistory(shared_state.packet_history_size)
+    shared_state.flow_table = FlowTable()
+    shared_state.rtp_tracker = RtpTracker()
+    shared_state.window_rtp = {"rtp_loss": 0, "weighted_jitter": 0.0, "jitter_weight": 0}
 
     shared_state.tcp_expected_packets_total = 0
     shared_state.tcp_lost_packets_total = 0
@@ -335,11 +482,13 @@ def reset_shared_state():
         "unencrypted_percentage": 0.0
     }
 
-    shared_state.top_talkers_cumulative = {}
-    shared_state.top_talkers_top7 = []
+    shared_state.top_talkers = SpaceSaving(shared_state.top_talkers_capacity)
+    shared_state.top_talkers_top_n = []
+    shared_state.encoded_state = {}
 
     shared_state.queried_public_ips = set()
     shared_state.new_geolocations = []
+    shared_state.passive_dns = PassiveDns()
 
     shared_state.ip_stats = {}
 
@@ -453,6 +602,20 @@ def reset_shared_state():
     shared_state.last_periodic_summary_time = None
 
 
+async def stop_reader_task():
+    """Cancel the background tshark reader if it is running"""
+    task = shared_state.reader_task
+    shared_state.reader_task = None
+    if task is None or task.done():
+        return
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
 async def stop_tshark():
     """Stop tshark packet capture process"""
     if shared_state.tshark_proc:
@@ -462,6 +625,9 @@ async def stop_tshark():
             shared_state.capture_active = False
             await asyncio.sleep(0.2) # Give loops a moment to see the flag
 
+            # Stop the background reader before the pipe goes away
+            await stop_reader_task()
+
             # 2. Terminate the process
             try:
                 shared_state.tshark_proc.terminate()
@@ -488,187 +654,309 @@ async def stop_tshark():
     return False, "Tshark was not running"
 
 
-# Parse packet once and store only needed fields for display
-# T.C: O(1) for 1 packet
-def parse_and_store_packet(parts):
-    """Parse the packet"""
-    try:
-        frame_number = parts[0] or "N/A"
-        timestamp = parts[1] or "N/A"
+def stream_key_for(parts):
+    """Group a tshark record into a (protocol, stream id) key"""
+    ip_proto = parts[15] if parts[15] else "N/A"
+    proto = parts[5] if parts[5] else "N/A"
+    tcp_stream = parts[7] if parts[7] else "N/A"
+    udp_stream = parts[8] if parts[8] else "N/A"
+    rtp_ssrc = parts[13] if parts[13] else "N/A"
+    proto_temp = parts[20] if parts[20] else "N/A"
+
+    proto_name = protocol_map.get(ip_proto, None)
+    proto_temp = protocol_map.get(proto_temp, None)
+
+    if ((proto_name == "tcp" or
+        proto == "tcp" or
+        proto_temp == "tcp") and
+        tcp_stream != "N/A"
+    ):
+        return ("tcp", tcp_stream)
+    if proto_name == "udp" and udp_stream != "N/A":
+        return ("udp", udp_stream)
+    if "RTP" in proto.upper() and rtp_ssrc != "N/A":
+        return ("rtp", rtp_ssrc)
+    return (proto.lower(), "misc")
+
+
+def ingest_packet(parts):
+    """Process one tshark record into the ingest buffer (runs on the reader task)"""
+    batch = shared_state.ingest_batch
+    if len(batch) >= shared_state.max_ingest_packets:
+        shared_state.ingest_dropped_packets += 1
+        return
 
-        source_ip = parts[2] or parts[16] or "N/A"  # ip.src or ipv6.src
-        dest_ip = parts[3] or parts[17] or "N/A"    # ip.dst or ipv6.dst
+    # Parse once into the columnar batch, every consumer reads the typed columns
+    key = stream_key_for(parts)
+    row = batch.append(parts, key)
+    flow_key = shared_state.flow_table.flow_key(batch, row, key)
 
-        length = parts[4] or "0"
-        protocols = parts[5] or "N/A"
-        info = parts[6] or "N/A"
+    app_info = None
+    try:
+        # Extract fields by their new index
+        src_ip = parts[2] or parts[16]
+        dst_ip = parts[3] or parts[17]
+        _protocol = parts[5]
+
+        # Ports as parsed into the batch (-1 when absent)
+        src_port = batch.src_port[row]
+        dst_port = batch.dst_port[row]
+
+        dns_query = parts[27]
+        dns_responses = (parts[28] or "") + "," + (parts[29] or "")
+
+        # Get the new SNI field
+        sni_hostname = parts[30] if parts[30] else None
+        quic_sni = parts[31] if parts[31] else None
+
+        # Passive DNS: remember the name each answered address belongs to.
+        # dns_ttl (first answer) is also how long the IP -> app mapping stays valid
+        dns_ttl = None
+        if dns_query and (parts[28] or parts[29]):
+            dns_ttl = int(parts[32]) if parts[32].isdigit() else None
+            for answer_ip in (parts[28], parts[29]):
+                shared_state.passive_dns.observe(
+                    answer_ip, dns_query, dns_ttl, batch.timestamp[row]
+                )
 
-        # Format timestamp for display (do this once during storage)
-        if timestamp != "N/A":
-            try:
-                ts_float = float(timestamp)
-                formatted_time = datetime.fromtimestamp(ts_float).strftime("%H:%M:%S.%f")[:-3]
-            except (ValueError, TypeError, OverflowError):
-                formatted_time = timestamp
+        # The flow's label holds for its later packets: detect only on the first
+        # packet, when new evidence (SNI, DNS) appears, or while still unknown
+        flow_record = shared_state.flow_table.get(flow_key)
+        if (flow_record is not None and flow_record.app_info is not None
+                and flow_record.app_info["app"] != "Unknown"
+                and not (sni_hostname or quic_sni or dns_query)):
+            app_info = flow_record.app_info
+            shared_state.flow_table.app_reused += 1
         else:
-            formatted_time = "N/A"
-
-        packet_data = {
-            "no": frame_number,
-            "time": formatted_time,
-            "source": source_ip,
-            "destination": dest_ip,
-            "protocol": protocols,
-            "length": length,
-            "info": info
-        }
-        return packet_data
-    except (IndexError, TypeError, ValueError) as _e:
-        # Return minimal data on error
-        return {
-            "no": "N/A",
-            "time": "N/A",
-            "source": "N/A",
-            "destination": "N/A",
-            "protocol": "N/A",
-            "length": "0",
-            "info": "N/A"
-        }
-
-
-async def capture_packets(duration):
-    """Capture packets for specified duration using async readline"""
-    if not shared_state.tshark_proc or not shared_state.capture_active:
-        return
-
-    shared_state.streams = {}
-    shared_state.all_packets_history = []
+            # Detect the application using the new, prioritized logic
+            app_info = app_detector.detect_application(
+                src_ip, dst_ip, dst_port,
+                dns_query, dns_responses, sni_hostname, quic_sni,
+                dns_ttl, batch.timestamp[row], src_port
+            )
+            shared_state.flow_table.app_detected += 1
+        batch.set_app(row, app_info["app"])
+
+        # Update per-IP stats for the map
+        server_ip = dst_ip if not shared_state.direction_classifier.is_local(dst_ip) else src_ip
+        if server_ip:
+            if server_ip not in shared_state.ip_stats:
+                shared_state.ip_stats[server_ip] = {
+                    "packets": 0,
+                    "app_info": app_info
+                }
+
+            shared_state.ip_stats[server_ip]["packets"] += 1
+
+            if app_info['app'] != 'Unknown':
+                if shared_state.ip_stats[server_ip]["app_info"]['app'] == 'Unknown' or \
+                    shared_state.ip_stats[server_ip]["app_info"]['category'] == 'Web':
+                    shared_state.ip_stats[server_ip]["app_info"] = app_info
+
+    except (IndexError, TypeError, ValueError, KeyError) as e:
+        print(f"Exception: {e}")
+
+    if key not in shared_state.ingest_streams:
+        shared_state.ingest_streams[key] = []
+    shared_state.ingest_streams[key].append(row)
+
+    # Long-lived per-flow counters, and per-SSRC jitter/sequence state for RTP
+    shared_state.flow_table.update(batch, row, key, app_info, flow_key)
+    if key[0] == "rtp":
+        shared_state.rtp_tracker.update(batch, row, key)
+
+    # Keep the window totals current so the metrics tick only has to snapshot them
+    if shared_state.ingest_metrics is not None:
+        metrics_calculator.accumulate_packet(shared_state.ingest_metrics, batch, row)
+
+
+def ingest_records(records):
+    """Split and ingest a batch of tshark text records"""
+    for line in records:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            ingest_packet(line.split("|"))
+        except (IndexError, TypeError, ValueError, KeyError) as e:
+            print(f"Skipping malformed packet: {e}")
+
+
+async def replay_records(records):
+    """
+    Ingest records read from a capture file.
+    A file source can be paused, so a full ingest buffer applies backpressure instead of
+    dropping packets, and paced replays wait out the original gaps between packets.
+    """
+    while records:
+        while (shared_state.capture_active and
+               len(shared_state.ingest_batch) >= shared_state.max_ingest_packets):
+            await asyncio.sleep(REPLAY_BACKPRESSURE_DELAY)
+        if not shared_state.capture_active:
+            return
+
+        # Never hand ingest more records than the buffer has room for
+        room = shared_state.max_ingest_packets - len(shared_state.ingest_batch)
+        if shared_state.replay_paced:
+            await release_paced(records[:room])
+        else:
+            ingest_records(records[:room])
+        records = records[room:]
 
-    start = time.time()
-    new_packets_count = 0
 
-    while time.time() - start < duration and shared_state.capture_active:
+async def release_paced(records):
+    """Ingest replayed records following the original spacing of their timestamps"""
+    loop = asyncio.get_running_loop()
+    released = 0
+    for i, line in enumerate(records):
         try:
-            # Check if process is still alive
-            if shared_state.tshark_proc.returncode is not None:
-                print("Tshark process terminated unexpectedly")
-                break
+            packet_time = float(line.split("|", 2)[1])
+        except (IndexError, ValueError):
+            continue
+
+        if shared_state.replay_clock is None:
+            shared_state.replay_clock = (packet_time, loop.time())
+        first_packet_time, wall_start = shared_state.replay_clock
+
+        delay = (packet_time - first_packet_time) - (loop.time() - wall_start)
+        if delay > 0.001:
+            ingest_records(records[released:i])
+            released = i
+            await asyncio.sleep(delay)
+            if not shared_state.capture_active:
+                return
+
+    ingest_records(records[released:])
+
+
+async def tshark_reader_loop():
+    """
+    Continuously drain tshark stdout into the ingest buffer.
+    Runs for the whole capture so the pipe never fills up between metrics ticks.
+    Reads large blocks and splits many records per call instead of one readline() per packet.
+    """
+    proc = shared_state.tshark_proc
+    pending = b""
+
+    # Read until EOF, tshark may exit while its output is still in the pipe
+    while shared_state.capture_active:
+        try:
+            chunk = await proc.stdout.read(READ_CHUNK_SIZE)
+        except (OSError, ValueError) as e:
+            print(f"Error reading packet: {e}")
+            break
 
-            # It won't block the event loop, so frontend commands still work
-            try:
-                line_bytes = await asyncio.wait_for(
-                    shared_state.tshark_proc.stdout.readline(),
-                    timeout = 1.0
-                )
-            except asyncio.TimeoutError:
-                # Normal timeout - no data within 1 second, just continue
-                continue
-            except (asyncio.CancelledError, OSError) as e:
-                print(f"Exception: {e}")
-                continue
+        if not chunk:
+            print("Tshark output closed")
+            break
 
-            if not line_bytes:
-                break
+        # Keep the trailing partial record for the next read; decode only complete
+        # records so a multi-byte character split across reads is never mangled
+        complete, _, pending = (pending + chunk).rpartition(b"\n")
+        if complete:
+            records = complete.decode('utf-8', errors='ignore').split("\n")
+            if shared_state.capture_source == "file":
+                await replay_records(records)
+            else:
+                ingest_records(records)
 
-            line = line_bytes.decode('utf-8', errors='ignore').strip()
-            if not line:
-                continue
+        # read() returns immediately while data is buffered, so hand control
+        # back to the event loop after every block
+        await asyncio.sleep(0)
 
-            parts = line.split("|")
+    if shared_state.capture_source != "file" or not shared_state.capture_active:
+        return
 
-            try:
-                # Extract fields by their new index
-                src_ip = parts[2] or parts[16]
-                dst_ip = parts[3] or parts[17]
-                _protocol = parts[5]
-
-                tcp_srcport = parts[23]
-                tcp_dstport = parts[24]
-                udp_srcport = parts[25]
-                udp_dstport = parts[26]
-
-                _src_port = tcp_srcport or udp_srcport
-                dst_port = tcp_dstport or udp_dstport
-
-                dns_query = parts[27]
-                dns_responses = (parts[28] or "") + "," + (parts[29] or "")
-
-                # Get the new SNI field
-                sni_hostname = parts[30] if parts[30] else None
-                quic_sni = parts[31] if parts[31] else None
-
-                # Detect the application using the new, prioritized logic
-                app_info = app_detector.detect_application(
-                    src_ip, dst_ip, dst_port,
-                    dns_query, dns_responses, sni_hostname, quic_sni
-                )
+    # The pipe is drained, so the exit status is final
+    returncode = await proc.wait()
+    if returncode == 0:
+        if pending:
+            await replay_records([pending.decode('utf-8', errors='ignore')])
+        print("Replay finished")
+    else:
+        print(f"Tshark exited with code {returncode} during replay")
+    # The next metrics tick takes the last packets and ends the session
+    shared_state.replay_finished = True
+
+
+def new_metrics_accumulator():
+    """Running window totals for ingest, or None when the metrics engine rescans the window"""
+    if shared_state.metrics_engine in metrics_calculator.ACCUMULATING_ENGINES:
+        return metrics_calculator.make_window_accumulator()
+    return None
+
+
+def swap_ingest_buffers():
+    """Move everything read since the last tick into the current window"""
+    shared_state.packet_batch = shared_state.ingest_batch
+    shared_state.streams = shared_state.ingest_streams
+    shared_state.window_metrics = shared_state.ingest_metrics
+    shared_state.window_rtp = shared_state.rtp_tracker.close_window()
+    shared_state.packet_history.append_window(
+        shared_state.packet_batch,
+        [metrics_calculator.get_protocol_category(name)
+         for name in shared_state.packet_batch.protocols],
+    )
+    shared_state.ingest_batch = PacketBatch()
+    shared_state.ingest_streams = {}
+    shared_state.ingest_metrics = new_metrics_accumulator()
+
+    if shared_state.ingest_dropped_packets:
+        print(f"Ingest buffer full, dropped {shared_state.ingest_dropped_packets} packets")
+        shared_state.ingest_dropped_packets = 0
 
-                # Update per-IP stats for the map
-                server_ip = dst_ip if dst_ip not in shared_state.ip_address else src_ip
-                if server_ip:
-                    if server_ip not in shared_state.ip_stats:
-                        shared_state.ip_stats[server_ip] = {
-                            "packets": 0,
-                            "app_info": app_info
-                        }
 
-                    shared_state.ip_stats[server_ip]["packets"] += 1
+async def capture_packets(duration):
+    """
+    Wait for one capture window, then take the packets read in the background.
+    Returns True when this was the last window of a finished replay.
+    """
+    if not shared_state.tshark_proc or not shared_state.capture_active:
+        return False
 
-                    if app_info['app'] != 'Unknown':
-                        if shared_state.ip_stats[server_ip]["app_info"]['app'] == 'Unknown' or \
-                            shared_state.ip_stats[server_ip]["app_info"]['category'] == 'Web':
-                            shared_state.ip_stats[server_ip]["app_info"] = app_info
+    await asyncio.sleep(duration)
 
-            except (IndexError, TypeError, ValueError, KeyError) as e:
-                print(f"Exception: {e}")
+    # Read before the swap, so the window surely holds every replayed packet
+    last_window = shared_state.replay_finished
+    # A replay's tshark exits at end of file while the reader still drains its
+    # output, the reader reports how it ended
+    if (shared_state.capture_source != "file" and shared_state.tshark_proc is not None
+            and shared_state.tshark_proc.returncode is not None):
+        print("Tshark process terminated unexpectedly")
 
-            formatted_packet = parse_and_store_packet(parts)
-            if formatted_packet:
-                shared_state.all_packets_history.append(formatted_packet)
-                new_packets_count += 1
-
-            ip_proto = parts[15] if parts[15] else "N/A"
-            proto = parts[5] if parts[5] else "N/A"
-            tcp_stream = parts[7] if parts[7] else "N/A"
-            udp_stream = parts[8] if parts[8] else "N/A"
-            rtp_ssrc = parts[13] if parts[13] else "N/A"
-            proto_temp = parts[20] if parts[20] else "N/A"
-
-            proto_name = protocol_map.get(ip_proto, None)
-            proto_temp = protocol_map.get(proto_temp, None)
-
-            if ((proto_name == "tcp" or
-                proto == "tcp" or
-                proto_temp == "tcp") and
-                tcp_stream != "N/A"
-            ):
-                key = ("tcp", tcp_stream)
-            elif proto_name == "udp" and udp_stream != "N/A":
-                key = ("udp", udp_stream)
-            elif "RTP" in proto.upper() and rtp_ssrc != "N/A":
-                key = ("rtp", rtp_ssrc)
-            else:
-                key = (proto.lower(), "misc")
+    swap_ingest_buffers()
+    return last_window
 
-            if key not in shared_state.streams:
-                shared_state.streams[key] = []
-            shared_state.streams[key].append(parts)
 
-        except (asyncio.CancelledError, OSError, RuntimeError) as e:
-            print(f"Error reading packet: {e}")
-            break
+async def end_replay():
+    """End a capture session whose file was fully replayed"""
+    shared_state.capture_active = False
+    shared_state.replay_finished = False
+    await stop_reader_task()
+    if shared_state.tshark_proc is not None:
+        await shared_state.tshark_proc.wait()
+        shared_state.tshark_proc = None
+    metrics_calculator.update_metrics_status("stopped")
+    print("Replay session ended")
 
 
 def clear_all_packets():
     """Clear all stored packets"""
+    shared_state.packet_batch = PacketBatch()
     shared_state.streams = {}
-    shared_state.all_packets_history = []
+    shared_state.ingest_batch = PacketBatch()
+    shared_state.ingest_streams = {}
+    shared_state.ingest_metrics = new_metrics_accumulator()
+    shared_state.window_metrics = None
+    shared_state.packet_history = PacketHistory(shared_state.packet_history_size)
+    shared_state.encoded_state = {}
     print("All packets cleared")
 
 
 def get_formatted_packets(display_count):
-    """Get formatted packets for display - FAST! No re-parsing needed"""
-    return shared_state.all_packets_history[-display_count:]  # Direct slice - O(1) operation!
+    """Get the newest retained packets for display"""
+    packets, _has_more = shared_state.packet_history.page(limit=display_count)
+    return packets
 
 
 def is_capture_active():
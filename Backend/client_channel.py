@@ -0,0 +1,193 @@
+"""
+Per-client outbound queue.
+
+Every connected client gets a bounded queue of ready-to-send frames and its
+own writer task. The capture/metrics loops only enqueue (never await a
+socket), so one slow client cannot stall the pipeline or the other clients.
+When a queue is full the configured policy decides what happens:
+
+- "drop_oldest": drop the oldest queued update to make room;
+- "coalesce": drop every queued update, keeping only the newest snapshot;
+- "disconnect": close the connection of the slow client.
+
+Only updates are ever dropped or coalesced; command responses, initial
+state and summaries are always delivered, up to a hard cap of
+HARD_LIMIT_FACTOR times the queue size: past it the client is disconnected
+whatever the policy. Updates are either full
+snapshots or deltas against the previous update, so a delta whose base was
+dropped is dropped too and the client gets a snapshot on the next tick.
+"""
+
+import asyncio
+from collections import deque
+
+import websockets
+
+
+FULL_QUEUE_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Frames that may be dropped or replaced by a newer one
+SNAPSHOT_KIND = "snapshot"
+DELTA_KIND = "delta"
+UPDATE_KINDS = (SNAPSHOT_KIND, DELTA_KIND)
+
+# Queued frames allowed (in queue sizes) when nothing is left to drop
+HARD_LIMIT_FACTOR = 4
+
+
+class ClientChannel:
+    """Bounded outbound queue and writer task of one websocket client."""
+
+    __slots__ = (
+        "websocket", "text", "queue", "max_size", "policy", "wakeup", "writer",
+        "sent", "dropped", "coalesced", "max_depth", "closed", "needs_snapshot",
+    )
+
+    def __init__(self, websocket, max_size, policy, text=True):
+        self.websocket = websocket
+        self.text = text            # Text (JSON) or binary (MessagePack) frames
+        self.queue = deque()        # (kind, frame)
+        self.max_size = max(1, int(max_size))
+        self.policy = policy
+        self.wakeup = asyncio.Event()
+        self.writer = None
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.closed = False
+        self.needs_snapshot = True  # No delta base yet (or it was dropped)
+
+    def start(self):
+        """Start the writer task"""
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def stop(self):
+        """Stop the writer task and discard queued frames"""
+        self.closed = True
+        self.queue.clear()
+        if self.writer is not None:
+            self.writer.cancel()
+            self.writer = None
+
+    def enqueue(self, frame, kind):
+        """Queue a frame without waiting. Returns False when the client was dropped."""
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_size:
+            if not self._make_room():
+                return False
+
+        self.queue.append((kind, frame))
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.wakeup.set()
+        return True
+
+    def enqueue_update(self, delta_frame, build_snapshot):
+        """
+        Queue this tick's update: the delta, or a snapshot (built on demand)
+        when the client has no base for the delta. Returns False when the client was dropped.
+        """
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_size:
+            if not self._make_room():
+                return False
+
+        if self.needs_snapshot or delta_frame is None:
+            self.needs_snapshot = False
+            return self.enqueue(build_snapshot(), SNAPSHOT_KIND)
+        return self.enqueue(delta_frame, DELTA_KIND)
+
+    def _make_room(self):
+        """Apply the full-queue policy. Returns False when the client was disconnected."""
+        if self.policy == "disconnect":
+            self._disconnect()
+            return False
+        if self.policy == "coalesce":
+            self._drop_updates(len(self.queue))
+        else:
+            self._drop_updates(1)
+
+        # Only frames that are never dropped are left
+        if len(self.queue) >= self.max_size * HARD_LIMIT_FACTOR:
+            self._disconnect()
+            return False
+        return True
+
+    def _disconnect(self):
+        """Close the connection of a client that does not keep up"""
+        print(f"Client {id(self.websocket)} too slow "
+              f"({len(self.queue)} frames queued), disconnecting")
+        self.closed = True
+        self.queue.clear()
+        asyncio.create_task(self.websocket.close(1008, "Client too slow"))
+
+    def _drop_updates(self, limit):
+        """
+        Drop up to `limit` queued updates, oldest first, then the deltas left
+        without a base. Without a queued snapshot the next update is a snapshot.
+        """
+        kept = deque()
+        oldest_removed = 0
+        removed = 0
+        has_base = True
+        for item in self.queue:
+            kind = item[0]
+            if kind in UPDATE_KINDS and oldest_removed < limit:
+                oldest_removed += 1
+                removed += 1
+                has_base = False
+            elif kind == DELTA_KIND and not has_base:
+                removed += 1
+            else:
+                if kind == SNAPSHOT_KIND:
+                    has_base = True
+                kept.append(item)
+        self.queue = kept
+        if not has_base:
+            self.needs_snapshot = True
+
+        if self.policy == "coalesce":
+            self.coalesced += removed
+        else:
+            self.dropped += removed
+
+    async def _write_loop(self):
+        """Send queued frames in order until the connection closes"""
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                _, frame = self.queue.popleft()
+                await self.websocket.send(frame, text=self.text)
+                self.sent += 1
+        except websockets.exceptions.ConnectionClosed:
+            self.closed = True
+            self.queue.clear()
+        except (websockets.exceptions.WebSocketException, OSError, RuntimeError,
+                TypeError, ValueError) as e:
+            # Nothing would be sent anymore, close so the handler cleans up
+            print(f"Client {id(self.websocket)} writer failed: {e}")
+            self.closed = True
+            self.queue.clear()
+            asyncio.create_task(self.websocket.close(1011, "Send failed"))
+
+    def stats(self):
+        """Queue depth and drop counters"""
+        return {
+            "client_id": id(self.websocket),
+            "policy": self.policy,
+            "queue_depth": len(self.queue),
+            "max_queue_depth": self.max_depth,
+            "queue_size": self.max_size,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "closed": self.closed,
+            "needs_snapshot": self.needs_snapshot,
+        }
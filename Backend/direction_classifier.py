@@ -0,0 +1,93 @@
+"""
+Traffic direction classification against the device's own addresses.
+
+Built from capture_manager.get_device_ips(): exact host addresses go into a
+dict and optional local subnets (CIDR, from the LOCAL_SUBNETS setting) into
+one set of masked network numbers per prefix length. Lookups are memoized
+per address, so classifying a packet is a couple of dict lookups instead of
+list scans.
+"""
+
+from ipaddress import ip_address, ip_network
+
+
+# Memoized addresses before the cache is cleared
+MAX_CACHED_ADDRESSES = 65536
+
+
+def parse_subnets(value):
+    """Parse a comma-separated list of CIDR subnets, skipping invalid entries"""
+    subnets = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            subnets.append(ip_network(item, strict=False))
+        except ValueError as e:
+            print(f"Ignoring invalid local subnet {item}: {e}")
+    return subnets
+
+
+class DirectionClassifier:
+    """Answers whether an address is local (IPv4 / IPv6) and which way a packet goes."""
+
+    __slots__ = ("hosts", "networks", "cache")
+
+    def __init__(self, ipv4_hosts=(), ipv6_hosts=(), subnets=()):
+        self.hosts = {}
+        for ip in ipv4_hosts:
+            self.hosts[ip] = 4
+        for ip in ipv6_hosts:
+            self.hosts[ip] = 6
+
+        # (ip version, prefix length) -> set of network numbers (address >> host bits)
+        self.networks = {}
+        for network in subnets:
+            host_bits = network.max_prefixlen - network.prefixlen
+            self.networks.setdefault((network.version, host_bits), set()).add(
+                int(network.network_address) >> host_bits
+            )
+
+        self.cache = {}
+
+    def local_family(self, ip):
+        """4 or 6 when the address belongs to this device (or a local subnet), else 0"""
+        family = self.cache.get(ip)
+        if family is not None:
+            return family
+
+        family = self.hosts.get(ip, 0)
+        if not family and self.networks and ip and ip != "N/A":
+            try:
+                address = ip_address(ip)
+            except ValueError:
+                address = None
+            if address is not None:
+                value = int(address)
+                for (version, host_bits), network_numbers in self.networks.items():
+                    if version == address.version and (value >> host_bits) in network_numbers:
+                        family = version
+                        break
+
+        if len(self.cache) >= MAX_CACHED_ADDRESSES:
+            self.cache.clear()
+        self.cache[ip] = family
+        return family
+
+    def is_local(self, ip):
+        """True when the address belongs to this device (or a local subnet)"""
+        return self.local_family(ip) != 0
+
+    def classify(self, source_ip, destination_ip):
+        """
+        ("outbound" | "inbound" | None, "ipv4" | "ipv6" | None) for a packet.
+        The source decides first, so traffic between two local addresses is outbound.
+        """
+        family = self.local_family(source_ip)
+        if family:
+            return "outbound", "ipv4" if family == 4 else "ipv6"
+        family = self.local_family(destination_ip)
+        if family:
+            return "inbound", "ipv4" if family == 4 else "ipv6"
+        return None, None
@@ -0,0 +1,274 @@
+"""
+Display filters for the raw packet stream.
+
+A filter expression such as
+
+    proto == TCP and (src == 10.0.0.5 or dst == 10.0.0.5) and len > 1000
+
+is parsed once into a tree of small functions. Before a window is filtered the
+tree is bound to its PacketBatch: string conditions are resolved against the
+batch's interned IPs, protocol names and applications, so the per-row test only
+compares integers from the typed columns.
+
+Fields: no, time, len, port, sport, dport, src, dst, ip, proto, app, info.
+Operators: == != > >= < <= contains, combined with and / or / not (&& || !)
+and parentheses. "ip" and "port" match either direction. Numeric conditions
+never match packets lacking the field (no port, no timestamp).
+"""
+
+import operator
+import re
+
+
+class FilterError(ValueError):
+    """Invalid display filter expression"""
+
+
+TOKEN_PATTERN = re.compile(
+    r'\s*(?:(\(|\)|==|!=|>=|<=|>|<|&&|\|\||!)|"([^"]*)"|([^\s()!=<>&|"]+))'
+)
+
+COMPARISONS = {
+    "==": operator.eq, "eq": operator.eq,
+    "!=": operator.ne, "ne": operator.ne,
+    ">": operator.gt, "gt": operator.gt,
+    ">=": operator.ge, "ge": operator.ge,
+    "<": operator.lt, "lt": operator.lt,
+    "<=": operator.le, "le": operator.le,
+}
+
+# Value of a numeric column when the packet lacks the field
+ABSENT = -1
+
+# Numeric fields: name -> PacketBatch columns (any of them may match)
+NUMERIC_FIELDS = {
+    "no": ("frame_number",),
+    "frame": ("frame_number",),
+    "time": ("timestamp",),
+    "len": ("length",),
+    "length": ("length",),
+    "port": ("src_port", "dst_port"),
+    "sport": ("src_port",),
+    "dport": ("dst_port",),
+}
+
+# Interned string fields: name -> (index columns, interned values attribute)
+INTERNED_FIELDS = {
+    "src": (("src",), "ips"),
+    "dst": (("dst",), "ips"),
+    "ip": (("src", "dst"), "ips"),
+    "proto": (("protocol",), "protocols"),
+    "protocol": (("protocol",), "protocols"),
+    "app": (("app",), "apps"),
+}
+
+
+def tokenize(text):
+    """Split an expression into operator, quoted string and word tokens"""
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            raise FilterError(f"Unexpected character at {position}: {text[position:]!r}")
+        symbol, quoted, word = match.groups()
+        if symbol is not None:
+            tokens.append(("symbol", symbol))
+        elif quoted is not None:
+            tokens.append(("value", quoted))
+        else:
+            tokens.append(("word", word))
+        position = match.end()
+    return tokens
+
+
+def _bind_numeric(columns, compare, value):
+    """
+    Comparison of numeric columns against a constant. Like an absent field in
+    Wireshark, a column holding ABSENT (no port, no timestamp) never matches;
+    "!=" on two columns means no present value is equal.
+    """
+    def bind(batch):
+        arrays = [getattr(batch, name) for name in columns]
+        if len(arrays) == 1:
+            column = arrays[0]
+            return lambda row: column[row] != ABSENT and compare(column[row], value)
+        first, second = arrays
+        if compare is operator.ne:
+            return lambda row: (
+                (first[row] != ABSENT or second[row] != ABSENT)
+                and first[row] != value and second[row] != value
+            )
+        return lambda row: (
+            (first[row] != ABSENT and compare(first[row], value))
+            or (second[row] != ABSENT and compare(second[row], value))
+        )
+    return bind
+
+
+def _bind_interned(columns, values_attribute, test):
+    """Test of interned strings, resolved once per batch to a set of matching indices"""
+    def bind(batch):
+        matching = {
+            index for index, name in enumerate(getattr(batch, values_attribute)) if test(name)
+        }
+        arrays = [getattr(batch, name) for name in columns]
+        if not matching:
+            return lambda row: False
+        if len(arrays) == 1:
+            column = arrays[0]
+            return lambda row: column[row] in matching
+        first, second = arrays
+        return lambda row: first[row] in matching or second[row] in matching
+    return bind
+
+
+def _bind_info(test):
+    """Test of the per-row info column"""
+    def bind(batch):
+        info = batch.info
+        return lambda row: test(info[row])
+    return bind
+
+
+def _bind_not(operand):
+    def bind(batch):
+        test = operand(batch)
+        return lambda row: not test(row)
+    return bind
+
+
+def _bind_and(left, right):
+    def bind(batch):
+        first, second = left(batch), right(batch)
+        return lambda row: first(row) and second(row)
+    return bind
+
+
+def _bind_or(left, right):
+    def bind(batch):
+        first, second = left(batch), right(batch)
+        return lambda row: first(row) or second(row)
+    return bind
+
+
+class _Parser:
+    """Recursive descent parser producing bind functions"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise FilterError("Unexpected end of filter")
+        self.position += 1
+        return token
+
+    def at_keyword(self, *keywords):
+        kind, text = self.peek()
+        return kind in ("word", "symbol") and text is not None and text.lower() in keywords
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek()[0] is not None:
+            raise FilterError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.at_keyword("or", "||"):
+            self.take()
+            node = _bind_or(node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.at_keyword("and", "&&"):
+            self.take()
+            node = _bind_and(node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.at_keyword("not", "!"):
+            self.take()
+            return _bind_not(self.parse_not())
+        if self.peek() == ("symbol", "("):
+            self.take()
+            node = self.parse_or()
+            if self.take() != ("symbol", ")"):
+                raise FilterError("Missing closing parenthesis")
+            return node
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        kind, field = self.take()
+        if kind != "word":
+            raise FilterError(f"Expected a field name, got {field!r}")
+        field = field.lower()
+
+        _, op = self.take()
+        op = op.lower()
+        if op != "contains" and op not in COMPARISONS:
+            raise FilterError(f"Unknown operator {op!r}")
+
+        kind, value = self.take()
+        if kind == "symbol":
+            raise FilterError(f"Expected a value after {op!r}, got {value!r}")
+
+        # For strings "a != b" is "not a == b", so fields matching either direction
+        # mean "neither"; numeric fields handle "!=" themselves (absent values)
+        if op in ("!=", "ne") and field not in NUMERIC_FIELDS:
+            return _bind_not(self.comparison(field, "==", value))
+        return self.comparison(field, op, value)
+
+    @staticmethod
+    def comparison(field, op, value):
+        """Bind function of one field comparison"""
+        if field in NUMERIC_FIELDS:
+            if op == "contains":
+                raise FilterError(f"contains is not supported for {field}")
+            try:
+                number = float(value)
+            except ValueError as e:
+                raise FilterError(f"{field} needs a number, got {value!r}") from e
+            return _bind_numeric(NUMERIC_FIELDS[field], COMPARISONS[op], number)
+
+        if op == "contains":
+            needle = value.lower()
+            test = lambda text: needle in text.lower()
+        elif COMPARISONS[op] is operator.eq:
+            expected = value.lower()
+            test = lambda text: text.lower() == expected
+        else:
+            raise FilterError(f"{op} is not supported for {field}")
+
+        if field in INTERNED_FIELDS:
+            columns, values_attribute = INTERNED_FIELDS[field]
+            return _bind_interned(columns, values_attribute, test)
+        if field == "info":
+            return _bind_info(test)
+        raise FilterError(f"Unknown field {field!r}")
+
+
+class DisplayFilter:
+    """A compiled display filter expression."""
+
+    __slots__ = ("text", "_bind")
+
+    def __init__(self, text):
+        self.text = text
+        tokens = tokenize(text)
+        if not tokens:
+            raise FilterError("Empty filter")
+        self._bind = _Parser(tokens).parse()
+
+    def matching_rows(self, batch):
+        """Indices of the batch rows matching the filter"""
+        test = self._bind(batch)
+        return [row for row in range(len(batch)) if test(row)]
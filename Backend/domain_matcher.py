@@ -0,0 +1,66 @@
+"""
+Multi-pattern substring matcher for domain names.
+
+The domain pattern table is compiled once into an Aho-Corasick automaton, so a
+domain is matched against every pattern in a single pass over its characters
+instead of one substring search per pattern. Each state remembers the
+highest-priority pattern (earliest in table order) that ends there, so the
+result is the same as checking the patterns one by one in table order.
+"""
+
+
+class DomainMatcher:
+    """Aho-Corasick automaton over an ordered pattern -> value table."""
+
+    __slots__ = ("transitions", "best", "values")
+
+    def __init__(self, patterns):
+        self.values = []            # Value of each pattern, by priority
+        self.transitions = [{}]     # Per state: character -> next state
+        self.best = [None]          # Per state: priority of the best pattern ending there
+
+        # Trie of the patterns
+        for priority, (pattern, value) in enumerate(patterns.items()):
+            self.values.append(value)
+            state = 0
+            for char in pattern:
+                next_state = self.transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions[state][char] = next_state
+                    self.transitions.append({})
+                    self.best.append(None)
+                state = next_state
+            if self.best[state] is None:
+                self.best[state] = priority
+
+        # Breadth-first: failure links, best match through the suffix chain, and
+        # missing transitions copied from the failure state (a complete automaton)
+        queue = [(state, 0) for state in self.transitions[0].values()]
+        for state, failure in queue:
+            own = self.transitions[state]
+            for char, child in own.items():
+                queue.append((child, self.transitions[failure].get(char, 0)))
+
+            inherited = self.best[failure]
+            if inherited is not None and (self.best[state] is None or inherited < self.best[state]):
+                self.best[state] = inherited
+
+            completed = dict(self.transitions[failure])
+            completed.update(own)
+            self.transitions[state] = completed
+
+    def match(self, text):
+        """Value of the first pattern (in table order) contained in text, or None"""
+        transitions = self.transitions
+        best = self.best
+        state = 0
+        found = None
+        for char in text:
+            state = transitions[state].get(char, 0)
+            priority = best[state]
+            if priority is not None and (found is None or priority < found):
+                found = priority
+                if found == 0:
+                    break
+        return self.values[found] if found is not None else None
@@ -0,0 +1,182 @@
+"""
+Long-lived flow table.
+
+Flows are keyed by their stream key (("tcp", tcp.stream), ("udp", udp.stream),
+("rtp", ssrc)); traffic that tshark does not assign a stream id to is keyed by
+protocol and address pair instead. Records survive across capture windows and
+are updated in O(1) per packet. The table is kept in last-seen order, so idle
+flows are evicted from the front and a hard size cap bounds memory.
+"""
+
+from collections import OrderedDict
+
+
+# Flows with no packet for this many seconds (packet time) are evicted
+FLOW_IDLE_TIMEOUT = 120
+
+# Hard cap on tracked flows, the least recently seen flow is evicted first
+MAX_FLOWS = 50000
+
+
+class FlowRecord:
+    """Counters of one flow. "forward" is the direction of its first packet."""
+
+    __slots__ = (
+        "protocol", "source_ip", "destination_ip", "source_port", "destination_port",
+        "forward_packets", "forward_bytes", "reverse_packets", "reverse_bytes",
+        "first_seen", "last_seen", "rtt_sum", "rtt_count", "retransmissions", "app_info",
+    )
+
+    def __init__(self, protocol, source_ip, destination_ip, source_port, destination_port,
+                 timestamp):
+        self.protocol = protocol
+        self.source_ip = source_ip
+        self.destination_ip = destination_ip
+        self.source_port = source_port
+        self.destination_port = destination_port
+        self.forward_packets = 0
+        self.forward_bytes = 0
+        self.reverse_packets = 0
+        self.reverse_bytes = 0
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.rtt_sum = 0.0          # milliseconds
+        self.rtt_count = 0
+        self.retransmissions = 0
+        self.app_info = None
+
+    def average_rtt(self):
+        """Mean RTT of the flow in milliseconds (0 when no samples)"""
+        return self.rtt_sum / self.rtt_count if self.rtt_count else 0.0
+
+    def to_dict(self):
+        """Flow summary for the frontend"""
+        return {
+            "protocol": self.protocol,
+            "source": self.source_ip,
+            "destination": self.destination_ip,
+            "source_port": self.source_port,
+            "destination_port": self.destination_port,
+            "forward_packets": self.forward_packets,
+            "forward_bytes": self.forward_bytes,
+            "reverse_packets": self.reverse_packets,
+            "reverse_bytes": self.reverse_bytes,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "duration": self.last_seen - self.first_seen,
+            "latency": self.average_rtt(),
+            "retransmissions": self.retransmissions,
+            "app": self.app_info["app"] if self.app_info else "Unknown",
+        }
+
+
+class FlowTable:
+    """Flow records in last-seen order with idle-timeout and size-cap eviction."""
+
+    __slots__ = (
+        "flows", "idle_timeout", "max_flows", "clock", "evicted_idle", "evicted_full",
+        "app_detected", "app_reused",
+    )
+
+    def __init__(self, idle_timeout=FLOW_IDLE_TIMEOUT, max_flows=MAX_FLOWS):
+        self.flows = OrderedDict()
+        self.idle_timeout = idle_timeout
+        self.max_flows = max_flows
+        self.clock = 0.0            # Latest packet time seen
+        self.evicted_idle = 0
+        self.evicted_full = 0
+        self.app_detected = 0       # Packets that ran application detection
+        self.app_reused = 0         # Packets labelled from their flow's app instead
+
+    def __len__(self):
+        return len(self.flows)
+
+    def get(self, flow_key):
+        """Flow record of a key, or None"""
+        return self.flows.get(flow_key)
+
+    @staticmethod
+    def flow_key(batch, row, stream_key):
+        """Stream key when tshark assigned a stream id, otherwise protocol + address pair"""
+        if stream_key[1] != "misc":
+            return stream_key
+        source_ip = batch.source_ip(row)
+        destination_ip = batch.destination_ip(row)
+        if source_ip > destination_ip:
+            source_ip, destination_ip = destination_ip, source_ip
+        return (stream_key[0], source_ip, destination_ip)
+
+    def update(self, batch, row, stream_key, app_info=None, flow_key=None):
+        """Add one packet of the batch to its flow. Returns the flow record."""
+        timestamp = batch.timestamp[row]
+        if timestamp >= 0:
+            self.clock = max(self.clock, timestamp)
+        else:
+            timestamp = self.clock
+
+        if flow_key is None:
+            flow_key = self.flow_key(batch, row, stream_key)
+        record = self.flows.get(flow_key)
+        if record is None:
+            record = FlowRecord(
+                stream_key[0], batch.source_ip(row), batch.destination_ip(row),
+                batch.src_port[row], batch.dst_port[row], timestamp
+            )
+            self.flows[flow_key] = record
+        else:
+            self.flows.move_to_end(flow_key)
+
+        length = batch.length[row]
+        if batch.source_ip(row) == record.source_ip:
+            record.forward_packets += 1
+            record.forward_bytes += length
+        else:
+            record.reverse_packets += 1
+            record.reverse_bytes += length
+        record.last_seen = max(record.last_seen, timestamp)
+
+        rtt = batch.rtt[row]
+        if rtt > 0:
+            record.rtt_sum += rtt * 1000
+            record.rtt_count += 1
+        if batch.retransmission[row]:
+            record.retransmissions += 1
+
+        # Keep the first specific label, but let a specific app replace a generic "Web" one
+        if app_info and app_info["app"] != "Unknown":
+            if (record.app_info is None or record.app_info["app"] == "Unknown"
+                    or record.app_info["category"] == "Web"):
+                record.app_info = app_info
+        elif record.app_info is None:
+            record.app_info = app_info
+
+        self.evict()
+        return record
+
+    def evict(self):
+        """Drop idle flows from the front, then the oldest flows beyond the size cap"""
+        flows = self.flows
+        idle_before = self.clock - self.idle_timeout
+        while flows:
+            oldest = next(iter(flows.values()))
+            if oldest.last_seen >= idle_before:
+                break
+            flows.popitem(last=False)
+            self.evicted_idle += 1
+
+        while len(flows) > self.max_flows:
+            flows.popitem(last=False)
+            self.evicted_full += 1
+
+    def recent_flows(self, limit):
+        """Most recently active flows first"""
+        result = []
+        for record in reversed(self.flows.values()):
+            if len(result) >= limit:
+                break
+            result.append(record.to_dict())
+        return result
+
+    def app_stats(self):
+        """How many packets ran application detection and how many reused their flow's label"""
+        return {"detected": self.app_detected, "reused": self.app_reused}
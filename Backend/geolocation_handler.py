@@ -32,17 +32,19 @@ async def fetch_geolocation(session, ip):
     global LAST_API_CALL_TIME
     hostname = None
 
-    # Get rDNS hostname
-    try:
-        loop = asyncio.get_running_loop()
-        dns_lookup_task = loop.run_in_executor(None, socket.gethostbyaddr, ip)
-        hostname_tuple = await asyncio.wait_for(dns_lookup_task, timeout=1.5)
-        hostname = hostname_tuple[0]
-    except (asyncio.TimeoutError, socket.herror):
-        hostname = None
-    except OSError as exc:
-        print(f"Error during rDNS lookup for {ip}: {exc}")
-        hostname = None
+    # Name from a captured DNS answer, else an rDNS lookup
+    hostname = shared_state.passive_dns.lookup(ip)
+    if hostname is None:
+        try:
+            loop = asyncio.get_running_loop()
+            dns_lookup_task = loop.run_in_executor(None, socket.gethostbyaddr, ip)
+            hostname_tuple = await asyncio.wait_for(dns_lookup_task, timeout=1.5)
+            hostname = hostname_tuple[0]
+        except (asyncio.TimeoutError, socket.herror):
+            hostname = None
+        except OSError as exc:
+            print(f"Error during rDNS lookup for {ip}: {exc}")
+            hostname = None
 
     # CHECK STATIC DATABASE FIRST and if not found here
     # then only make API Call
@@ -96,8 +98,9 @@ async def process_geolocation_batch(ips_to_query):
 
             if result and isinstance(result, dict):
                 # Add passively captured DNS name if it exists
-                if ip in shared_state.ip_to_dns:
-                    result["dns_name"] = shared_state.ip_to_dns[ip]
+                dns_name = shared_state.passive_dns.lookup(ip)
+                if dns_name:
+                    result["dns_name"] = dns_name
 
                 # Add application info if it exists
                 if ip in shared_state.ip_stats:
@@ -108,24 +111,15 @@ async def process_geolocation_batch(ips_to_query):
                 shared_state.new_geolocations.append(result)
 
 def extract_ips_from_packets(_packets_data):
-    """Extract unique public IPs from raw packet data"""
+    """Extract unique public IPs from the current packet batch"""
     public_ips = set()
-    all_raw_packets = []
-    if shared_state.streams:
-        for packet_list in shared_state.streams.values():
-            all_raw_packets.extend(packet_list)
 
-    for parts in all_raw_packets:
-        try:
-            source = parts[2] or parts[16]
-            destination = parts[3] or parts[17]
-            for ip in [source, destination]:
-                if ip and ip != "N/A" and is_public_ip(ip):
-                    if (ip not in shared_state.ip_address and
-                        ip not in shared_state.queried_public_ips):
-                        public_ips.add(ip)
-        except (IndexError, TypeError):
-            continue
+    # The batch interns addresses, so each distinct IP of the window is checked once
+    for ip in shared_state.packet_batch.ips:
+        if ip and ip != "N/A" and is_public_ip(ip):
+            if (not shared_state.direction_classifier.is_local(ip) and
+                ip not in shared_state.queried_public_ips):
+                public_ips.add(ip)
     return public_ips
 
 async def geolocation_loop():
@@ -0,0 +1,90 @@
+"""
+Bounded heavy-hitters tracking (Space-Saving algorithm).
+
+Tracks at most `capacity` keys by weight (bytes). When a new key arrives and
+the table is full, the key with the smallest count is replaced and the new key
+inherits that count as its error. This gives, with N the total weight seen and
+K the capacity:
+
+- every reported count overestimates the true weight by at most its `error`,
+  and error <= N / K;
+- every key whose true weight exceeds N / K is guaranteed to be in the table.
+
+The minimum is found with a lazy min-heap: updates push a fresh (count, key)
+entry and stale entries are skipped when popped, so an update is O(log K)
+amortized. The heap is rebuilt once stale entries outnumber live ones.
+"""
+
+import heapq
+
+
+class HeavyHitterEntry:
+    """Counters of one tracked key"""
+
+    __slots__ = ("count", "error", "packets")
+
+    def __init__(self, count, error, packets):
+        self.count = count      # Weight (bytes), an overestimate by at most error
+        self.error = error
+        self.packets = packets  # Packets since the key entered the table
+
+
+class SpaceSaving:
+    """Top-K keys by weight in fixed memory."""
+
+    __slots__ = ("capacity", "entries", "heap", "total")
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.entries = {}
+        self.heap = []          # (count, key), may hold stale counts
+        self.total = 0          # N: total weight seen
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def error_bound(self):
+        """Maximum overestimate of any reported count (N / K)"""
+        return self.total / self.capacity
+
+    def update(self, key, weight, packets=1):
+        """Add weight (and packets) to a key"""
+        self.total += weight
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            entry.count += weight
+            entry.packets += packets
+        elif len(self.entries) < self.capacity:
+            entry = HeavyHitterEntry(weight, 0, packets)
+            self.entries[key] = entry
+        else:
+            # Replace the current minimum, the new key inherits its count as error
+            min_count, min_key = self._pop_min()
+            del self.entries[min_key]
+            entry = HeavyHitterEntry(min_count + weight, min_count, packets)
+            self.entries[key] = entry
+
+        heapq.heappush(self.heap, (entry.count, key))
+        if len(self.heap) > 2 * self.capacity + 64:
+            self._rebuild_heap()
+
+    def _pop_min(self):
+        """Pop the live entry with the smallest count, skipping stale heap items"""
+        while True:
+            count, key = heapq.heappop(self.heap)
+            entry = self.entries.get(key)
+            if entry is not None and entry.count == count:
+                return count, key
+
+    def _rebuild_heap(self):
+        """Drop stale heap items"""
+        self.heap = [(entry.count, key) for key, entry in self.entries.items()]
+        heapq.heapify(self.heap)
+
+    def top(self, n):
+        """The n heaviest keys as (key, entry), heaviest first"""
+        return heapq.nlargest(n, self.entries.items(), key=lambda item: item[1].count)
@@ -0,0 +1,130 @@
+"""
+Bounded lookup caches with hit/miss/eviction counters.
+
+LruCache keeps the most recently used entries up to a size cap. TtlCache also
+gives every entry an expiry time (seconds since the epoch, usually the packet
+time), so stale mappings stop being served. Expired entries are dropped when looked
+up; beyond the size cap the oldest stored entry goes first.
+"""
+
+from collections import OrderedDict
+
+
+class LruCache:
+    """Size-capped mapping, least recently used entry evicted first."""
+
+    __slots__ = ("entries", "max_size", "hits", "misses", "evictions")
+
+    def __init__(self, max_size):
+        self.entries = OrderedDict()
+        self.max_size = max(1, int(max_size))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """Cached value of a key (refreshing its recency), or default"""
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry beyond the cap"""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Size and counters"""
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TtlCache:
+    """Size-capped mapping whose entries expire, least recently stored evicted first."""
+
+    __slots__ = (
+        "entries", "max_size", "default_ttl", "hits", "misses", "evictions", "expirations",
+    )
+
+    def __init__(self, max_size, default_ttl):
+        self.entries = OrderedDict()    # key -> (value, expires_at)
+        self.max_size = max(1, int(max_size))
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, now, default=None):
+        """Value of a key that has not expired at time now, or default"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[1] <= now:
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, now, ttl=None):
+        """Store a value for ttl seconds (default_ttl when None) from time now"""
+        self.entries[key] = (value, now + (self.default_ttl if ttl is None else ttl))
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            _, (_, expires_at) = self.entries.popitem(last=False)
+            if expires_at <= now:
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def stats(self):
+        """Size and counters"""
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "default_ttl": self.default_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
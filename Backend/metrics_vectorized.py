@@ -0,0 +1,179 @@
+"""
+Vectorized (NumPy) metrics engine.
+
+Computes the same window totals as metrics_calculator.aggregate_window, but
+with array operations over the columns of a PacketBatch: direction masks
+against the device IPs, per-protocol byte/packet sums, goodput,
+retransmission counts and weighted TCP latency. RTP loss and jitter are
+tracked per stream at ingest (rtp_tracker.py) and are not part of the engines.
+"""
+
+import shared_state
+import metrics_calculator
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+# Row buckets, one per per-protocol metrics dictionary (OTHER has none)
+TCP, RTP, UDP, QUIC, DNS, IGMP, OTHER = range(7)
+BUCKET_NAMES = ["tcp", "rtp", "udp", "quic", "dns", "igmp"]
+
+STREAM_BUCKETS = {
+    "tcp": TCP,
+    "rtp": RTP,
+    "udp": UDP,
+    "quic": QUIC,
+    "dns": DNS,
+    "igmp": IGMP,
+    "igmpv1": IGMP,
+    "igmpv2": IGMP,
+    "igmpv3": IGMP,
+}
+
+
+def _column(values, dtype):
+    """Zero-copy NumPy view of a PacketBatch column"""
+    return np.frombuffer(values, dtype=dtype)
+
+
+def _add_direction_totals(metrics, bucket_rows, lengths, mask, direction):
+    """Add packet and byte sums of the masked rows to each bucket's metrics"""
+    packets = np.bincount(bucket_rows[mask], minlength=OTHER + 1)
+    byte_sums = np.bincount(bucket_rows[mask], weights=lengths[mask], minlength=OTHER + 1)
+    for bucket, name in enumerate(BUCKET_NAMES):
+        metrics[name][f"{direction}_packets"] += int(packets[bucket])
+        metrics[name][f"{direction}_bytes"] += float(byte_sums[bucket])
+
+
+def aggregate_window(batch, streams):
+    """
+    Vectorized metrics engine.
+    Returns the same window totals as metrics_calculator.aggregate_window.
+    """
+    totals = metrics_calculator.make_window_totals()
+    totals["packets"] = len(batch)
+    if len(batch) == 0:
+        return totals
+
+    timestamps = _column(batch.timestamp, np.float64)
+    lengths = _column(batch.length, np.int64)
+    src = _column(batch.src, np.int32)
+    dst = _column(batch.dst, np.int32)
+    protocol = _column(batch.protocol, np.int32)
+    tcp_len = _column(batch.tcp_len, np.int32).astype(np.int64)
+    udp_len = _column(batch.udp_len, np.int32).astype(np.int64)
+    rtt = _column(batch.rtt, np.float64)
+    retransmission = _column(batch.retransmission, np.int8).astype(bool)
+    stream = _column(batch.stream, np.int32)
+
+    # Bucket of every row, resolved once per stream key
+    stream_buckets = np.array(
+        [STREAM_BUCKETS.get(proto, OTHER) for proto, _ in batch.stream_keys], dtype=np.int64
+    )
+    bucket_rows = stream_buckets[stream]
+
+    # Direction masks: membership is checked once per distinct IP, then gathered per row.
+    # The priority mirrors the reference engine (src v4, src v6, dst v4, dst v6).
+    local_family = np.array(
+        [shared_state.direction_classifier.local_family(ip) for ip in batch.ips], dtype=np.int8
+    )
+    device_v4 = local_family == 4
+    device_v6 = local_family == 6
+    src_v4, src_v6 = device_v4[src], device_v6[src]
+    dst_v4, dst_v6 = device_v4[dst], device_v6[dst]
+
+    out_v4 = src_v4
+    out_v6 = ~src_v4 & src_v6
+    in_v4 = ~src_v4 & ~src_v6 & dst_v4
+    in_v6 = ~src_v4 & ~src_v6 & ~dst_v4 & dst_v6
+    outbound = out_v4 | out_v6
+    inbound = in_v4 | in_v6
+
+    # Per-protocol and per-IP-version packet and byte sums
+    metrics = totals["protocols"]
+    _add_direction_totals(metrics, bucket_rows, lengths, outbound, "outbound")
+    _add_direction_totals(metrics, bucket_rows, lengths, inbound, "inbound")
+    for name, mask, direction in (
+        ("ipv4", out_v4, "outbound"), ("ipv6", out_v6, "outbound"),
+        ("ipv4", in_v4, "inbound"), ("ipv6", in_v6, "inbound"),
+    ):
+        metrics[name][f"{direction}_packets"] += int(np.count_nonzero(mask))
+        metrics[name][f"{direction}_bytes"] += float(lengths[mask].sum())
+
+    totals["inbound_bytes"] = int(lengths[inbound].sum())
+    totals["outbound_bytes"] = int(lengths[outbound].sum())
+
+    # Goodput (application bytes) per row
+    header = metrics_calculator.HEADER_SIZES
+    ip_header = np.where(out_v4 | in_v4, header["ipv4"], header["ipv6"])
+    igmp_header = np.where(src_v4, header["ipv4"], header["ipv6"])
+    goodput = np.select(
+        [bucket_rows == TCP, bucket_rows == RTP, bucket_rows <= DNS, bucket_rows == IGMP],
+        [
+            np.where(retransmission, 0, tcp_len),
+            udp_len - header["udp"] - header["rtp"],
+            np.maximum(0, udp_len - header["udp"]),
+            np.maximum(0, lengths - igmp_header),
+        ],
+        default=lengths - ip_header,
+    )
+    totals["inbound_goodput_bytes"] = int(goodput[inbound].sum())
+    totals["outbound_goodput_bytes"] = int(goodput[outbound].sum())
+
+    # Capture window bounds (TCP accepts a zero timestamp, other protocols do not)
+    valid_time = np.where(bucket_rows == TCP, timestamps >= 0, timestamps > 0)
+    if valid_time.any():
+        totals["start_time"] = float(timestamps[valid_time].min())
+        totals["end_time"] = max(0, float(timestamps[valid_time].max()))
+
+    # Packet loss counters
+    tcp_rows = bucket_rows == TCP
+    totals["tcp_packets"] = int(np.count_nonzero(tcp_rows))
+    totals["tcp_retransmissions"] = int(np.count_nonzero(retransmission & tcp_rows))
+    totals["rtp_packets"] = int(np.count_nonzero(bucket_rows == RTP))
+
+    # Weighted TCP latency: mean RTT per stream weighted by the stream's packet count
+    stream_count = len(batch.stream_keys)
+    rtt_rows = tcp_rows & (rtt > 0)
+    rtt_sums = np.bincount(stream[rtt_rows], weights=rtt[rtt_rows] * 1000, minlength=stream_count)
+    rtt_counts = np.bincount(stream[rtt_rows], minlength=stream_count)
+    stream_sizes = np.bincount(stream, minlength=stream_count)
+    has_rtt = rtt_counts > 0
+    totals["weighted_latency"] = float(
+        (rtt_sums[has_rtt] / rtt_counts[has_rtt] * stream_sizes[has_rtt]).sum()
+    )
+    totals["latency_weight"] = int(stream_sizes[has_rtt].sum())
+
+    # Protocol distribution and encryption, counted per interned protocol name
+    protocol_packets = np.bincount(protocol, minlength=len(batch.protocols))
+    for index, name in enumerate(batch.protocols):
+        count = int(protocol_packets[index])
+        if count == 0:
+            continue
+        category = metrics_calculator.get_protocol_category(name)
+        totals["protocol_counts"][category] = totals["protocol_counts"].get(category, 0) + count
+        if metrics_calculator.is_encrypted_protocol(name):
+            totals["encrypted_packets"] += count
+        else:
+            totals["unencrypted_packets"] += count
+
+    # Talker pairs: group rows by (src, dst) index pair
+    ip_count = len(batch.ips)
+    pairs = src.astype(np.int64) * ip_count + dst
+    unique_pairs, pair_rows, pair_packets = np.unique(
+        pairs, return_inverse=True, return_counts=True
+    )
+    pair_bytes = np.bincount(pair_rows, weights=lengths)
+    for pair, packets, pair_length in zip(
+        unique_pairs.tolist(), pair_packets.tolist(), pair_bytes.tolist()
+    ):
+        source_ip = batch.ips[pair // ip_count]
+        destination_ip = batch.ips[pair % ip_count]
+        totals["talkers"][(source_ip, destination_ip)] = [packets, int(pair_length)]
+
+    return totals
@@ -0,0 +1,55 @@
+"""
+MessagePack frames for clients that connect with ?encoding=msgpack.
+
+Messages carry the same fields as the JSON ones, but packet rows
+("new_packets", "packets", also in history pages) are positional arrays in the
+order given once by the "schema" message sent on connect, instead of dicts
+repeating every key.
+JSON stays the default encoding.
+"""
+
+from packet_batch import PACKET_FIELDS
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+
+# Fields holding lists of packet display rows
+PACKET_ROW_FIELDS = ("new_packets", "packets")
+
+
+def packet_rows(packets):
+    """Packet dicts as positional rows in PACKET_FIELDS order"""
+    return [[packet[name] for name in PACKET_FIELDS] for packet in packets]
+
+
+def schema_frame():
+    """One-time schema message describing positional packet rows"""
+    return msgpack.packb({"type": "schema", "packet_fields": list(PACKET_FIELDS)})
+
+
+def pack_message(message):
+    """Encode a plain message (command responses, summaries), packet lists as positional rows"""
+    if any(name in message for name in PACKET_ROW_FIELDS):
+        message = {
+            name: packet_rows(value) if name in PACKET_ROW_FIELDS else value
+            for name, value in message.items()
+        }
+    return msgpack.packb(message)
+
+
+def build_frame(message_type, fields, field_names, header=None):
+    """Encode a dashboard message from field values, packet lists as positional rows"""
+    message = {"type": message_type}
+    if header:
+        message.update(header)
+    for name in field_names:
+        value = fields[name]
+        if name in PACKET_ROW_FIELDS:
+            value = packet_rows(value)
+        message[name] = value
+    return msgpack.packb(message)
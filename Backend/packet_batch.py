@@ -0,0 +1,260 @@
+"""
+Columnar packet storage for one capture window.
+
+Every tshark record is parsed exactly once at ingest into typed arrays
+(lengths, timestamps, ports, payload lengths, RTT, RTP fields) plus
+interned columns for IP addresses, protocol names and stream keys. The metrics
+calculator, the geolocation handler and the packet table all read the
+same batch instead of re-parsing split strings. Display rows for the packet
+table are only built for the packets actually sent or paged.
+"""
+
+from array import array
+from datetime import datetime
+
+
+# Positions of the fields inside a tshark record (see capture_manager.TSHARK_FIELDS)
+FRAME_NUMBER = 0
+TIME_EPOCH = 1
+IP_SRC = 2
+IP_DST = 3
+FRAME_LEN = 4
+PROTOCOL = 5
+INFO = 6
+TCP_RTT = 9
+TCP_RETRANSMISSION = 10
+TCP_FAST_RETRANSMISSION = 11
+TCP_SPURIOUS_RETRANSMISSION = 12
+RTP_SEQ = 14
+IPV6_SRC = 16
+IPV6_DST = 17
+RTP_TIMESTAMP = 18
+RTP_PAYLOAD_TYPE = 19
+TCP_LEN = 21
+UDP_LENGTH = 22
+TCP_SRCPORT = 23
+TCP_DSTPORT = 24
+UDP_SRCPORT = 25
+UDP_DSTPORT = 26
+
+# Records shorter than this cannot be parsed into a row
+MIN_RECORD_FIELDS = UDP_DSTPORT + 1
+
+# Keys of a packet display row, in the order of positional (binary) rows
+PACKET_FIELDS = ("no", "time", "source", "destination", "protocol", "length", "info")
+
+# "HH:MM:SS" of recently formatted seconds, only the milliseconds differ per packet
+_second_labels = {}
+MAX_SECOND_LABELS = 4096
+
+
+def _to_int(value, default):
+    """Convert a tshark field to int, falling back to default when empty or invalid"""
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _to_float(value, default):
+    """Convert a tshark field to float, falling back to default when empty or invalid"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def _is_set(flag):
+    """tshark analysis flags are present ("1") or empty"""
+    return bool(flag) and flag.strip() != "0"
+
+
+def format_time(timestamp):
+    """Epoch seconds as local "HH:MM:SS.mmm", "N/A" when missing"""
+    if timestamp < 0:
+        return "N/A"
+    try:
+        second = int(timestamp)
+        # Rounded to microseconds like datetime, then truncated to milliseconds
+        micros = round((timestamp - second) * 1000000)
+        if micros >= 1000000:
+            second += 1
+            micros -= 1000000
+
+        label = _second_labels.get(second)
+        if label is None:
+            if len(_second_labels) >= MAX_SECOND_LABELS:
+                _second_labels.clear()
+            label = datetime.fromtimestamp(second).strftime("%H:%M:%S")
+            _second_labels[second] = label
+        return f"{label}.{micros // 1000:03d}"
+    except (ValueError, OverflowError, OSError):
+        return str(timestamp)
+
+
+class PacketBatch:
+    """
+    Typed, column-oriented storage for the packets of one window.
+    Missing numeric fields are stored as -1 (or 0 for byte counts and RTT),
+    missing IPs and protocol names as "N/A".
+    """
+
+    __slots__ = (
+        "frame_number", "timestamp", "length", "src", "dst", "protocol",
+        "ip_version", "info", "src_port", "dst_port", "tcp_len", "udp_len",
+        "rtt", "retransmission", "rtp_seq", "rtp_timestamp", "rtp_payload_type",
+        "stream", "app", "ips", "_ip_index", "protocols", "_protocol_index",
+        "stream_keys", "_stream_index", "apps", "_app_index",
+    )
+
+    def __init__(self):
+        self.frame_number = array("q")
+        self.timestamp = array("d")
+        self.length = array("q")
+        self.src = array("i")           # index into self.ips
+        self.dst = array("i")           # index into self.ips
+        self.protocol = array("i")      # index into self.protocols
+        self.ip_version = array("b")    # 4, 6 or 0 when neither header is present
+        self.info = []
+        self.src_port = array("i")
+        self.dst_port = array("i")
+        self.tcp_len = array("i")
+        self.udp_len = array("i")
+        self.rtt = array("d")           # seconds
+        self.retransmission = array("b")
+        self.rtp_seq = array("i")
+        self.rtp_timestamp = array("q")
+        self.rtp_payload_type = array("i")
+        self.stream = array("i")        # index into self.stream_keys
+        self.app = array("i")           # index into self.apps, -1 until detected
+
+        # Interned values shared by all rows of the batch
+        self.ips = []
+        self._ip_index = {}
+        self.protocols = []
+        self._protocol_index = {}
+        self.stream_keys = []
+        self._stream_index = {}
+        self.apps = []
+        self._app_index = {}
+
+    def __len__(self):
+        return len(self.frame_number)
+
+    def _intern_ip(self, ip):
+        index = self._ip_index.get(ip)
+        if index is None:
+            index = len(self.ips)
+            self._ip_index[ip] = index
+            self.ips.append(ip)
+        return index
+
+    def _intern_protocol(self, protocol):
+        index = self._protocol_index.get(protocol)
+        if index is None:
+            index = len(self.protocols)
+            self._protocol_index[protocol] = index
+            self.protocols.append(protocol)
+        return index
+
+    def _intern_stream(self, stream_key):
+        index = self._stream_index.get(stream_key)
+        if index is None:
+            index = len(self.stream_keys)
+            self._stream_index[stream_key] = index
+            self.stream_keys.append(stream_key)
+        return index
+
+    def append(self, parts, stream_key):
+        """Parse one split tshark record of the given stream and append it. Returns the row index."""
+        # Validate up front so a short record never leaves the columns misaligned
+        if len(parts) < MIN_RECORD_FIELDS:
+            raise IndexError(f"tshark record has {len(parts)} fields")
+
+        row = len(self.frame_number)
+
+        source_ip = parts[IP_SRC] or parts[IPV6_SRC] or "N/A"
+        dest_ip = parts[IP_DST] or parts[IPV6_DST] or "N/A"
+        version = 4 if parts[IP_SRC] else 6 if parts[IPV6_SRC] else 0
+
+        self.frame_number.append(_to_int(parts[FRAME_NUMBER], -1))
+        self.timestamp.append(_to_float(parts[TIME_EPOCH], -1.0))
+        self.length.append(_to_int(parts[FRAME_LEN], 0))
+        self.src.append(self._intern_ip(source_ip))
+        self.dst.append(self._intern_ip(dest_ip))
+        self.protocol.append(self._intern_protocol(parts[PROTOCOL] or "N/A"))
+        self.ip_version.append(version)
+        self.info.append(parts[INFO] or "N/A")
+
+        self.src_port.append(_to_int(parts[TCP_SRCPORT] or parts[UDP_SRCPORT], -1))
+        self.dst_port.append(_to_int(parts[TCP_DSTPORT] or parts[UDP_DSTPORT], -1))
+        self.tcp_len.append(_to_int(parts[TCP_LEN], 0))
+        self.udp_len.append(_to_int(parts[UDP_LENGTH], 0))
+
+        self.rtt.append(_to_float(parts[TCP_RTT], 0.0))
+        retransmitted = (
+            (_is_set(parts[TCP_RETRANSMISSION]) or _is_set(parts[TCP_FAST_RETRANSMISSION]))
+            and not _is_set(parts[TCP_SPURIOUS_RETRANSMISSION])
+        )
+        self.retransmission.append(1 if retransmitted else 0)
+
+        self.rtp_seq.append(_to_int(parts[RTP_SEQ], -1))
+        self.rtp_timestamp.append(_to_int(parts[RTP_TIMESTAMP], -1))
+        self.rtp_payload_type.append(_to_int(parts[RTP_PAYLOAD_TYPE], -1))
+        self.stream.append(self._intern_stream(stream_key))
+        self.app.append(-1)
+
+        return row
+
+    def set_app(self, row, app):
+        """Record the application detected for a row"""
+        index = self._app_index.get(app)
+        if index is None:
+            index = len(self.apps)
+            self._app_index[app] = index
+            self.apps.append(app)
+        self.app[row] = index
+
+    def source_ip(self, row):
+        """Source IP (IPv4 or IPv6) of a row"""
+        return self.ips[self.src[row]]
+
+    def destination_ip(self, row):
+        """Destination IP (IPv4 or IPv6) of a row"""
+        return self.ips[self.dst[row]]
+
+    def protocol_name(self, row):
+        """tshark protocol column of a row"""
+        return self.protocols[self.protocol[row]]
+
+    def stream_key(self, row):
+        """(protocol, stream id) key of the stream a row belongs to"""
+        return self.stream_keys[self.stream[row]]
+
+    def app_name(self, row):
+        """Detected application of a row, or None"""
+        index = self.app[row]
+        return self.apps[index] if index >= 0 else None
+
+    def display_row(self, row):
+        """Display row of a packet for the packet table"""
+        frame_number = self.frame_number[row]
+        return {
+            "no": str(frame_number) if frame_number >= 0 else "N/A",
+            "time": format_time(self.timestamp[row]),
+            "source": self.ips[self.src[row]],
+            "destination": self.ips[self.dst[row]],
+            "protocol": self.protocols[self.protocol[row]],
+            "length": str(self.length[row]),
+            "info": self.info[row],
+        }
+
+    def display_rows(self, rows=None):
+        """Display rows of the given rows (default: every row), built on demand"""
+        if rows is None:
+            rows = range(len(self))
+        return [self.display_row(row) for row in rows]
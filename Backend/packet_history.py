@@ -0,0 +1,237 @@
+"""
+Bounded server-side packet history.
+
+Keeps the packet batches of past capture windows until `capacity` packets
+are retained; the oldest windows are evicted whole.
+Frame numbers (and, in practice, timestamps) grow in capture order, so a page
+by frame number or time range is found with two binary searches, first over
+the windows and then inside one window's column, instead of a scan. Display
+rows are only built for the packets of the returned page.
+Searches by IP, port, protocol category or application go through the
+secondary indexes of packet_index.py.
+"""
+
+from bisect import bisect_left, bisect_right
+
+from packet_index import PacketIndex
+
+
+# Largest page a client can request
+MAX_PAGE_SIZE = 1000
+
+
+class HistoryWindow:
+    """Packets of one capture window"""
+
+    __slots__ = ("batch", "categories")
+
+    def __init__(self, batch, categories):
+        self.batch = batch
+        self.categories = categories  # Protocol category of each interned protocol name
+
+    def matches(self, row, ip, src, dst, port, protocol, app):
+        """True when a row satisfies every given condition"""
+        batch = self.batch
+        if ip is not None and ip != batch.source_ip(row) and ip != batch.destination_ip(row):
+            return False
+        if src is not None and src != batch.source_ip(row):
+            return False
+        if dst is not None and dst != batch.destination_ip(row):
+            return False
+        if port is not None and port != batch.src_port[row] and port != batch.dst_port[row]:
+            return False
+        if protocol is not None and protocol != self.categories[batch.protocol[row]]:
+            return False
+        if app is not None and app != batch.app_name(row):
+            return False
+        return True
+
+
+class PacketHistory:
+    """Retained capture windows in capture order, searchable by frame number and time."""
+
+    __slots__ = (
+        "capacity", "windows", "first_ids", "first_frames", "first_times", "size",
+        "evicted", "next_id", "index",
+    )
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.windows = []
+        self.first_ids = []         # History id of each window's first packet
+        self.first_frames = []      # First frame number of each window, for bisecting windows
+        self.first_times = []       # First timestamp of each window
+        self.size = 0
+        self.evicted = 0
+        self.next_id = 0            # Id of the next appended packet (ids follow capture order)
+        self.index = PacketIndex()
+
+    def __len__(self):
+        return self.size
+
+    def append_window(self, batch, protocol_categories):
+        """
+        Retain and index the packets of a finished window, evicting the oldest
+        windows beyond capacity. protocol_categories is aligned with batch.protocols.
+        """
+        count = len(batch)
+        if count == 0:
+            return
+
+        evicted = False
+        while self.windows and self.size + count > self.capacity:
+            oldest = self.windows.pop(0)
+            del self.first_ids[0]
+            del self.first_frames[0]
+            del self.first_times[0]
+            self.size -= len(oldest.batch)
+            self.evicted += len(oldest.batch)
+            evicted = True
+        if evicted:
+            self.index.evict_before(self.next_id - self.size, self.size)
+
+        self.windows.append(HistoryWindow(batch, protocol_categories))
+        self.first_ids.append(self.next_id)
+        self.first_frames.append(batch.frame_number[0])
+        self.first_times.append(batch.timestamp[0])
+        self.index.add_window(batch, self.next_id, protocol_categories)
+        self.size += count
+        self.next_id += count
+
+    def oldest_frame(self):
+        """Frame number of the oldest retained packet, or None"""
+        return self.first_frames[0] if self.windows else None
+
+    def newest_frame(self):
+        """Frame number of the newest retained packet, or None"""
+        return self.windows[-1].batch.frame_number[-1] if self.windows else None
+
+    def _locate(self, packet_id):
+        """(window, row) of a retained packet id"""
+        index = bisect_right(self.first_ids, packet_id) - 1
+        return self.windows[index], packet_id - self.first_ids[index]
+
+    def _id_after_frame(self, frame):
+        """Id of the first packet with a frame number above frame"""
+        index, row = self._position_after_frame(frame)
+        return self.first_ids[index] + row
+
+    def _position_after_frame(self, frame):
+        """(window, row) of the first packet with a frame number above frame"""
+        index = max(0, bisect_right(self.first_frames, frame) - 1)
+        return index, bisect_right(self.windows[index].batch.frame_number, frame)
+
+    def _position_at_time(self, timestamp):
+        """(window, row) of the first packet at or after timestamp"""
+        index = max(0, bisect_right(self.first_times, timestamp) - 1)
+        return index, bisect_left(self.windows[index].batch.timestamp, timestamp)
+
+    def _forward(self, index, row, limit, before_frame, end_time):
+        """Rows from a position onwards. Returns (rows, has_more)."""
+        result = []
+        while index < len(self.windows):
+            window = self.windows[index]
+            frames = window.batch.frame_number
+            timestamps = window.batch.timestamp
+            while row < len(frames):
+                if before_frame is not None and frames[row] >= before_frame:
+                    return result, False
+                if end_time is not None and timestamps[row] >= end_time:
+                    return result, False
+                if len(result) >= limit:
+                    return result, True
+                result.append(window.batch.display_row(row))
+                row += 1
+            index += 1
+            row = 0
+        return result, False
+
+    def _backward(self, index, row, limit):
+        """Up to limit rows before a position, in capture order. Returns (rows, has_more)."""
+        result = []
+        while index >= 0:
+            window = self.windows[index]
+            while row > 0:
+                if len(result) >= limit:
+                    result.reverse()
+                    return result, True
+                row -= 1
+                result.append(window.batch.display_row(row))
+            index -= 1
+            if index >= 0:
+                row = len(self.windows[index].batch)
+        result.reverse()
+        return result, False
+
+    def page(self, after_frame=None, before_frame=None, start_time=None, end_time=None,
+             limit=100):
+        """
+        One page of retained packets in capture order. Returns (rows, has_more).
+
+        after_frame and/or start_time page forwards from that point; otherwise the
+        page holds the newest packets before before_frame (or the newest overall).
+        end_time and before_frame bound a forward page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        if not self.windows:
+            return [], False
+
+        if after_frame is None and start_time is None:
+            if before_frame is None:
+                index = len(self.windows) - 1
+                row = len(self.windows[index].batch)
+            else:
+                index, row = self._position_after_frame(before_frame - 1)
+            return self._backward(index, row, limit)
+
+        position = (0, 0)
+        if after_frame is not None:
+            position = max(position, self._position_after_frame(after_frame))
+        if start_time is not None:
+            position = max(position, self._position_at_time(start_time))
+        return self._forward(position[0], position[1], limit, before_frame, end_time)
+
+    def query(self, ip=None, src=None, dst=None, port=None, protocol=None, app=None,
+              after_frame=None, before_frame=None, limit=100):
+        """
+        Retained packets matching every given condition, in capture order. The most
+        selective condition's index gives the candidates. Returns (rows, has_more).
+
+        ip matches either direction, src / dst one direction; protocol is a protocol
+        category (TCP, UDP, TLS, ...). after_frame pages forwards, otherwise the page
+        holds the newest matches before before_frame (or the newest overall).
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        if not self.windows:
+            return [], False
+
+        keys = []
+        for field, value in (("ip", ip), ("ip", src), ("ip", dst), ("port", port),
+                             ("protocol", protocol), ("app", app)):
+            if value is not None and (field, value) not in keys:
+                keys.append((field, value))
+        if not keys:
+            return self.page(after_frame=after_frame, before_frame=before_frame, limit=limit)
+
+        start_id = self.next_id - self.size
+        end_id = self.next_id
+        if after_frame is not None:
+            start_id = self._id_after_frame(after_frame)
+        if before_frame is not None:
+            end_id = self._id_after_frame(before_frame - 1)
+        newest = after_frame is None
+
+        rows = []
+        has_more = False
+        for packet_id in self.index.candidates(keys, start_id, end_id, newest):
+            window, row = self._locate(packet_id)
+            if not window.matches(row, ip, src, dst, port, protocol, app):
+                continue
+            if len(rows) >= limit:
+                has_more = True
+                break
+            rows.append(window.batch.display_row(row))
+
+        if newest:
+            rows.reverse()
+        return rows, has_more
@@ -0,0 +1,109 @@
+"""
+Secondary indexes over the packet history.
+
+Every retained packet has a history id, its position in capture order. For
+each indexed value (IP address, port, protocol category, application) the
+index keeps a posting list: an ascending array of the ids of the packets
+carrying that value. A query walks only the shortest posting list of its
+conditions and checks the other conditions on the candidate rows, so its cost
+follows the selectivity of the query, not the number of retained packets.
+Ids of evicted packets are skipped at query time and compacted away in bulk.
+"""
+
+from array import array
+from bisect import bisect_left
+
+
+class PacketIndex:
+    """Posting lists keyed by ("ip" | "port" | "protocol" | "app", value)."""
+
+    __slots__ = ("postings", "base_id", "stale")
+
+    def __init__(self):
+        self.postings = {}
+        self.base_id = 0        # Ids below this were evicted
+        self.stale = 0          # Evicted ids still stored in posting lists
+
+    def _posting(self, key):
+        """Posting list of a key, created empty when missing"""
+        posting = self.postings.get(key)
+        if posting is None:
+            posting = array("q")
+            self.postings[key] = posting
+        return posting
+
+    def add_window(self, batch, first_id, protocol_categories):
+        """
+        Index the rows of a window whose first row has id first_id.
+        protocol_categories maps the batch's interned protocol names to categories.
+        """
+        # Resolve the posting lists once per interned value, not per row
+        ip_postings = [self._posting(("ip", ip)) for ip in batch.ips]
+        protocol_postings = [
+            self._posting(("protocol", category)) for category in protocol_categories
+        ]
+        app_postings = [self._posting(("app", app)) for app in batch.apps]
+        port_postings = {}
+
+        def port_posting(port):
+            posting = port_postings.get(port)
+            if posting is None:
+                posting = port_postings[port] = self._posting(("port", port))
+            return posting
+
+        src, dst = batch.src, batch.dst
+        src_port, dst_port = batch.src_port, batch.dst_port
+        protocol, app = batch.protocol, batch.app
+        for row in range(len(batch)):
+            packet_id = first_id + row
+
+            ip_postings[src[row]].append(packet_id)
+            if dst[row] != src[row]:
+                ip_postings[dst[row]].append(packet_id)
+
+            source_port = src_port[row]
+            destination_port = dst_port[row]
+            if source_port >= 0:
+                port_posting(source_port).append(packet_id)
+            if destination_port >= 0 and destination_port != source_port:
+                port_posting(destination_port).append(packet_id)
+
+            protocol_postings[protocol[row]].append(packet_id)
+            if app[row] >= 0:
+                app_postings[app[row]].append(packet_id)
+
+    def evict_before(self, base_id, live_count):
+        """Forget ids below base_id, compacting once stale ids outnumber live ones"""
+        self.stale += base_id - self.base_id
+        self.base_id = base_id
+        if self.stale <= live_count:
+            return
+
+        for key in list(self.postings):
+            posting = self.postings[key]
+            start = bisect_left(posting, base_id)
+            if start == len(posting):
+                del self.postings[key]
+            elif start:
+                del posting[:start]
+        self.stale = 0
+
+    def candidates(self, keys, start_id, end_id, newest=False):
+        """
+        Ids in [start_id, end_id) of the shortest posting list among the keys,
+        oldest first or newest first. Empty when any key has no packets.
+        The caller checks the remaining conditions on each candidate row.
+        """
+        postings = []
+        for key in keys:
+            posting = self.postings.get(key)
+            if not posting:
+                return []
+            postings.append(posting)
+        driver = min(postings, key=len)
+
+        first = bisect_left(driver, max(start_id, self.base_id))
+        last = bisect_left(driver, end_id)
+        if newest:
+            return (driver[position] for position in range(last - 1, first - 1, -1))
+        return (driver[position] for position in range(first, last))
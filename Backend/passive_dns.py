@@ -0,0 +1,118 @@
+"""
+Passive DNS table.
+
+Every captured DNS answer maps its A / AAAA addresses to the queried name. The
+table keeps the latest name of each address with the answer TTL and when it
+was first and last seen (packet time), so the map and tables can show
+hostnames without active reverse lookups. Entries are kept in last-seen order
+and the least recently answered address is evicted beyond the size cap.
+Expired entries are still served (flagged "expired"): an old name is a better
+label than none.
+"""
+
+from collections import OrderedDict
+
+
+# Hard cap on remembered addresses
+MAX_DNS_ENTRIES = 50000
+
+# Assumed lifetime of answers whose TTL was not captured
+DEFAULT_DNS_TTL = 300
+
+# Largest listing a client can request
+MAX_DNS_LISTING = 1000
+
+
+class DnsRecord:
+    """Latest DNS name of one address"""
+
+    __slots__ = ("ip", "name", "ttl", "first_seen", "last_seen")
+
+    def __init__(self, ip, name, ttl, timestamp):
+        self.ip = ip
+        self.name = name
+        self.ttl = ttl
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+
+    def expires_at(self):
+        """Packet time at which the answer's TTL runs out"""
+        return self.last_seen + self.ttl
+
+    def to_dict(self, clock):
+        """Record for the frontend, expired relative to the latest packet time"""
+        return {
+            "ip": self.ip,
+            "name": self.name,
+            "ttl": self.ttl,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "expired": clock >= self.expires_at(),
+        }
+
+
+class PassiveDns:
+    """Address -> name records in last-seen order with a size cap."""
+
+    __slots__ = ("records", "max_entries", "clock", "answers", "evicted")
+
+    def __init__(self, max_entries=MAX_DNS_ENTRIES):
+        self.records = OrderedDict()
+        self.max_entries = max(1, int(max_entries))
+        self.clock = 0.0            # Latest answer time seen
+        self.answers = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def observe(self, ip, name, ttl, timestamp):
+        """Record one answered address of a DNS response"""
+        if not ip or not name:
+            return
+        if ttl is None:
+            ttl = DEFAULT_DNS_TTL
+        if timestamp >= 0:
+            self.clock = max(self.clock, timestamp)
+        else:
+            timestamp = self.clock
+        self.answers += 1
+
+        record = self.records.get(ip)
+        if record is None:
+            self.records[ip] = DnsRecord(ip, name, ttl, timestamp)
+            if len(self.records) > self.max_entries:
+                self.records.popitem(last=False)
+                self.evicted += 1
+            return
+
+        if record.name != name:
+            record.name = name
+            record.first_seen = timestamp
+        record.ttl = ttl
+        record.last_seen = max(record.last_seen, timestamp)
+        self.records.move_to_end(ip)
+
+    def lookup(self, ip):
+        """Latest captured DNS name of an address, or None"""
+        record = self.records.get(ip)
+        return record.name if record is not None else None
+
+    def entries(self, ips=None, name=None, limit=100):
+        """
+        Records of the given addresses, or the most recently answered ones
+        (optionally only names containing `name`), newest first.
+        """
+        limit = max(1, min(int(limit), MAX_DNS_LISTING))
+        if ips is not None:
+            found = (self.records.get(ip) for ip in ips)
+            return [record.to_dict(self.clock) for record in found if record is not None][:limit]
+
+        needle = name.lower() if name else None
+        result = []
+        for record in reversed(self.records.values()):
+            if len(result) >= limit:
+                break
+            if needle is None or needle in record.name.lower():
+                result.append(record.to_dict(self.clock))
+        return result
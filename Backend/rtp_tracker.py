@@ -0,0 +1,246 @@
+"""
+Persistent RTP stream state.
+
+Keeps one state per SSRC for the whole session: clock rate, previous
+transit time, running RFC 3550 jitter, highest sequence number and wrap
+count. Packets are added as they are ingested, so jitter and sequence
+gaps carry over capture window boundaries instead of restarting every
+tick. Streams that stop sending are evicted after an idle timeout.
+"""
+
+from collections import OrderedDict
+
+
+# Streams with no packet for this many seconds (packet time) are evicted
+RTP_IDLE_TIMEOUT = 30
+
+# Static payload type to clock rate mapping
+STATIC_PAYLOAD_RATES = {
+    0: 8000,     # PCMU (G.711 μ-law)
+    3: 8000,     # GSM
+    4: 8000,     # G723
+    5: 8000,     # DVI4 8kHz
+    6: 16000,    # DVI4 16kHz
+    7: 8000,     # LPC
+    8: 8000,     # PCMA (G.711 A-law)
+    9: 8000,     # G722
+    10: 44100,   # L16 stereo
+    11: 44100,   # L16 mono
+    12: 8000,    # QCELP
+    13: 8000,    # Comfort Noise
+    14: 90000,   # MPA (MPEG Audio)
+    15: 8000,    # G728
+    16: 11025,   # DVI4 11kHz
+    17: 22050,   # DVI4 22kHz
+    18: 8000,    # G729
+    26: 90000,   # JPEG
+    31: 90000,   # H261
+    32: 90000,   # MPV (MPEG Video)
+    33: 90000,   # MP2T (MPEG2 Transport)
+    34: 90000,   # H263
+}
+
+RTP_SEQ_MOD = 65536
+
+
+def detect_dynamic_clock_rate_inline(stream_packets):
+    """Detect clock rate using consecutive packet time/timestamp differences"""
+    if len(stream_packets) < 2:
+        return None
+
+    # Find first valid consecutive pair
+    for i in range(1, min(5, len(stream_packets))):
+        pkt1, pkt2 = stream_packets[i-1], stream_packets[i]
+
+        # Time difference (seconds)
+        time_diff = pkt2['arrival'] - pkt1['arrival']
+
+        # RTP timestamp difference
+        rtp_diff = pkt2['rtp_ts'] - pkt1['rtp_ts']
+
+        if time_diff > 0 and rtp_diff > 0:
+            # Calculate potential clock rate
+            calculated_rate = rtp_diff / time_diff
+
+            # Match to known rates with 15% tolerance
+            known_rates = [8000, 16000, 22050, 44100, 48000, 90000]
+            for known_rate in known_rates:
+                if abs(calculated_rate - known_rate) / known_rate < 0.15:
+                    return known_rate
+
+            # Fallback based on magnitude
+            return 8000 if calculated_rate < 20000 else 90000
+
+    return None
+
+
+class RtpStreamState:
+    """Loss and jitter state of one RTP stream (SSRC)."""
+
+    __slots__ = (
+        "clock_rate", "prev_transit", "jitter", "highest_seq", "cycles",
+        "packets_for_detection", "last_seen", "packets", "lost",
+        "window_packets", "window_lost",
+    )
+
+    def __init__(self):
+        self.clock_rate = None
+        self.prev_transit = None
+        self.jitter = 0.0               # RTP timestamp units
+        self.highest_seq = None
+        self.cycles = 0                 # Sequence wraps seen, in units of 65536
+        self.packets_for_detection = [] # For dynamic clock rate detection
+        self.last_seen = 0.0
+        self.packets = 0
+        self.lost = 0
+        self.window_packets = 0
+        self.window_lost = 0
+
+    def jitter_ms(self):
+        """Current jitter in milliseconds"""
+        if self.jitter > 0 and self.clock_rate:
+            return (self.jitter / self.clock_rate) * 1000
+        return 0.0
+
+    def extended_highest_seq(self):
+        """Highest sequence number including wraps (RFC 3550 extended sequence number)"""
+        if self.highest_seq is None:
+            return None
+        return self.cycles + self.highest_seq
+
+    def update_sequence(self, seq):
+        """Advance the highest sequence number. Returns the gap (lost packets) before seq."""
+        if self.highest_seq is None:
+            self.highest_seq = seq
+            return 0
+
+        delta = (seq - self.highest_seq) % RTP_SEQ_MOD
+        if delta == 0 or delta >= RTP_SEQ_MOD // 2:
+            # Duplicate, or a late/reordered packet behind the highest sequence
+            return 0
+
+        if seq < self.highest_seq:
+            # Wraparound case: highest_seq was near 65535, seq is near 0
+            self.cycles += RTP_SEQ_MOD
+        self.highest_seq = seq
+        return delta - 1
+
+    def update_jitter(self, rtp_ts, arrival_time, payload_type, seq):
+        """RFC 3550 interarrival jitter, processed in arrival order"""
+        # DYNAMIC CLOCK RATE DETECTION (inline)
+        if self.clock_rate is None:
+            # Store packet for clock rate detection
+            self.packets_for_detection.append({
+                'seq': seq,
+                'rtp_ts': rtp_ts,
+                'arrival': arrival_time
+            })
+
+            # Try static payload type first
+            if payload_type in STATIC_PAYLOAD_RATES:
+                self.clock_rate = STATIC_PAYLOAD_RATES[payload_type]
+
+            # If still no clock rate and we have enough packets, detect dynamically
+            if self.clock_rate is None and len(self.packets_for_detection) >= 2:
+                detected_rate = detect_dynamic_clock_rate_inline(self.packets_for_detection)
+                self.clock_rate = detected_rate if detected_rate else 8000  # Fallback
+
+            if self.clock_rate is not None:
+                self.packets_for_detection = []
+
+        # Calculate RFC 3550 jitter if we have clock rate
+        if self.clock_rate is not None:
+            arrival_rtp = int(arrival_time * self.clock_rate)
+            transit = arrival_rtp - rtp_ts
+
+            if self.prev_transit is not None:
+                d = abs(transit - self.prev_transit)
+                # RFC 3550 formula with 1/16 smoothing
+                self.jitter = self.jitter + (d - self.jitter) / 16
+
+            self.prev_transit = transit
+
+
+class RtpTracker:
+    """Per-SSRC RTP state kept across capture windows, in last-seen order."""
+
+    __slots__ = ("streams", "idle_timeout", "clock", "window_streams")
+
+    def __init__(self, idle_timeout=RTP_IDLE_TIMEOUT):
+        self.streams = OrderedDict()
+        self.idle_timeout = idle_timeout
+        self.clock = 0.0            # Latest packet time seen
+        self.window_streams = {}    # Streams with packets in the current window
+
+    def __len__(self):
+        return len(self.streams)
+
+    def update(self, batch, row, stream_key):
+        """Add one RTP packet of the batch to its stream state"""
+        state = self.streams.get(stream_key)
+        if state is None:
+            state = RtpStreamState()
+            self.streams[stream_key] = state
+        else:
+            self.streams.move_to_end(stream_key)
+        self.window_streams[stream_key] = state
+
+        arrival_time = batch.timestamp[row]
+        if arrival_time > 0:
+            self.clock = max(self.clock, arrival_time)
+            state.last_seen = max(state.last_seen, arrival_time)
+
+        state.packets += 1
+        state.window_packets += 1
+
+        # Packet Loss
+        seq = batch.rtp_seq[row]
+        if seq < 0:
+            return
+        gap = state.update_sequence(seq)
+        state.lost += gap
+        state.window_lost += gap
+
+        # Jitter
+        rtp_ts = batch.rtp_timestamp[row]
+        if rtp_ts >= 0 and arrival_time > 0:
+            state.update_jitter(rtp_ts, arrival_time, batch.rtp_payload_type[row], seq)
+
+    def close_window(self):
+        """
+        Loss and packet-weighted jitter of the streams active since the last call.
+        Resets the per-window counters and evicts idle streams.
+        """
+        rtp_loss = 0
+        weighted_jitter = 0.0
+        jitter_weight = 0
+
+        for state in self.window_streams.values():
+            rtp_loss += state.window_lost
+
+            # WEIGHTED JITTER CALCULATION: Weight by packet count in this window
+            stream_jitter_ms = state.jitter_ms()
+            if stream_jitter_ms > 0:
+                weighted_jitter += stream_jitter_ms * state.window_packets
+                jitter_weight += state.window_packets
+
+            state.window_packets = 0
+            state.window_lost = 0
+        self.window_streams = {}
+
+        self.evict()
+
+        return {
+            "rtp_loss": rtp_loss,
+            "weighted_jitter": weighted_jitter,
+            "jitter_weight": jitter_weight,
+        }
+
+    def evict(self):
+        """Drop streams that have been idle longer than the timeout"""
+        idle_before = self.clock - self.idle_timeout
+        while self.streams:
+            stream_key, oldest = next(iter(self.streams.items()))
+            if oldest.last_seen >= idle_before or stream_key in self.window_streams:
+                break
+            self.streams.popitem(last=False)
@@ -13,6 +13,14 @@ as constants which is not true and therefore disabled invalid-name error here.
 
 # pylint: disable=invalid-name
 
+from packet_batch import PacketBatch
+from packet_history import PacketHistory
+from flow_table import FlowTable
+from rtp_tracker import RtpTracker
+from heavy_hitters import SpaceSaving
+from direction_classifier import DirectionClassifier
+from passive_dns import PassiveDns
+
 # Duration value
 capture_duration = 1.5
 
@@ -20,18 +28,76 @@ session_start_time = None
 session_duration_final = 0
 
 # Packet storage
+# packet_batch holds the parsed columns of the current window,
+# streams maps a stream key to the row indices of its packets in that batch.
+# Display rows are built from the batch only when sent or paged.
+packet_batch = PacketBatch()
 streams = {}
-all_packets_history = []
+
+# Ingest buffer filled continuously by the background tshark reader.
+# The metrics tick swaps these out into packet_batch / streams.
+ingest_batch = PacketBatch()
+ingest_streams = {}
+max_ingest_packets = 200000  # Bound per window, extra packets are dropped
+ingest_dropped_packets = 0
+
+# Finished windows kept for paging (see packet_history.py)
+packet_history_size = 500000  # Packets retained, the oldest windows are evicted first
+packet_history = PacketHistory(packet_history_size)
+
+# Flows tracked across capture windows (see flow_table.py)
+flow_table = FlowTable()
+
+# RTP state per SSRC kept across capture windows (see rtp_tracker.py).
+# window_rtp holds the loss/jitter of the last window, taken at the metrics tick.
+rtp_tracker = RtpTracker()
+window_rtp = {"rtp_loss": 0, "weighted_jitter": 0.0, "jitter_weight": 0}
+
+# Metrics engine: "incremental" (totals kept up to date at ingest), "python"
+# (reference rescan of the window), "numpy" (vectorized rescan) or
+# "verify" (run all of them, report differences, publish the python result)
+metrics_engine = "incremental"
+
+# Running window totals filled at ingest (see metrics_calculator.make_window_accumulator).
+# The metrics tick swaps ingest_metrics into window_metrics together with the packet buffers.
+ingest_metrics = None
+window_metrics = None
 
 # Process state
 capture_active = False
 tshark_proc = None
+reader_task = None
 is_resetting = False  # Flag to block new connections during reset
 is_generating_summary = False # Flag to block 'start' during summary
 
-# WebSocket connections
+# Cached tshark -D interface list (see capture_manager.get_cached_interfaces)
+interfaces_cache = None
+interfaces_cached_at = None  # Event loop time of the last refresh, None when invalidated
+interfaces_refresh_task = None
+
+# Capture source: "interface" for live capture, "file" for pcap/pcapng replay
+capture_source = None
+replay_paced = False
+replay_clock = None  # (first packet epoch, event loop time) for paced replay
+replay_finished = False  # The whole file was read, the next tick is the last one
+
+# WebSocket connections: websocket -> {"connected_at", "channel" (ClientChannel),
+# "topics" (subscribed topics), "encoding" ("json" or "msgpack"),
+# "packet_filter" (DisplayFilter of the packets topic, or None)}
 connected_clients = {}
 
+# Outbound queue per client and what to do when it is full
+# ("drop_oldest", "coalesce" or "disconnect", see client_channel.py)
+client_queue_size = 16
+client_queue_policy = "drop_oldest"
+
+# JSON-encoded dashboard fields of the last update (version update_seq): the
+# base of the next delta and the source of initial_state. Emptied whenever the
+# state changes outside the metrics tick, clients then get a snapshot.
+encoded_state = {}
+encoded_values = {}  # Raw values of the encoded_state fields, packed for binary clients
+update_seq = 0
+
 # Protocol Distribution
 protocol_distribution = {
     "TCP": 0,
@@ -77,6 +143,9 @@ ip_address = []
 ipv4_ips = []
 ipv6_ips = []
 
+# Inbound/outbound lookup built from the lists above plus LOCAL_SUBNETS (CIDR, comma separated)
+direction_classifier = DirectionClassifier()
+
 # Packets per second
 packets_Per_Second = 0
 
@@ -201,18 +270,21 @@ encryption_composition = {
 }
 
 # Top Talkers - Cumulative tracking
-# Dictionary structure: {(src_ip, dst_ip): {"packets": count, "bytes": total_bytes}}
-top_talkers_cumulative = {}
+# Space-Saving table keyed by (src_ip, dst_ip), weighted by bytes (see heavy_hitters.py).
+# Counts overestimate by at most total_bytes / top_talkers_capacity.
+top_talkers_capacity = 1000
+top_talkers = SpaceSaving(top_talkers_capacity)
 
-# Top 7 talkers to send to frontend
-top_talkers_top7 = []
+# Top N talkers to send to frontend
+top_talkers_limit = 7
+top_talkers_top_n = []
 
 # Geolocation tracking
 queried_public_ips = set()  # Track IPs we've already queried
 new_geolocations = []  # New geolocations to send to frontend {ip: {lat, lon, city, country}}
 
-# Map resolved IPs to their DNS query name
-ip_to_dns = {}
+# IP -> DNS name learned from captured DNS answers (see passive_dns.py)
+passive_dns = PassiveDns()
 
 # Per-IP statistics for map visualization
 # Structure: {"ip_address": {"packets": Y, "app_info": {...}}}
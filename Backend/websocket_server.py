@@ -1,20 +1,389 @@
 """
 WebSocket server for client communication with robust delta updates.
 Auto-stops capture when all clients disconnect (like on refresh).
+
+Updates are versioned: every tick has a sequence number and is sent as a
+delta (only the changed keys of the metrics dicts) against the previous
+tick. Clients get a full snapshot on connect, on "resync" and whenever their
+delta chain was broken (dropped frames, state reset outside the tick).
 """
 import json
 import asyncio
 from datetime import datetime
+from urllib.parse import parse_qs, urlparse
 
 import websockets
 
+import app_detector
 import capture_manager
+import client_channel
+import display_filter
 import metrics_calculator
+import metrics_vectorized
+import msgpack_codec
 import shared_state
 import llm_summarizer
 import geolocation_handler
 
 
+# Top-level fields of "update" and "initial_state" messages, in message order.
+# "packets" in initial_state reuses the encoded "new_packets" window of the last update.
+UPDATE_FIELDS = [
+    "metrics", "new_packets", "packets_Per_Second", "tcp_metrics", "rtp_metrics",
+    "quic_metrics", "udp_metrics", "dns_metrics", "igmp_metrics", "ipv4_metrics",
+    "ipv6_metrics", "ip_composition", "encryption_composition", "top_talkers",
+    "new_geolocations",
+]
+INITIAL_STATE_FIELDS = [
+    "metrics", "packets", "interfaces", "packets_Per_Second", "tcp_metrics",
+    "rtp_metrics", "quic_metrics", "udp_metrics", "dns_metrics", "igmp_metrics",
+    "ipv4_metrics", "ipv6_metrics", "ip_composition", "encryption_composition",
+    "top_talkers",
+]
+
+# Fields sent whole in every update: they carry the tick's new data, not state to merge
+EVENT_FIELDS = ("new_packets", "new_geolocations")
+
+# Subscription topics and the message fields each covers. Clients start subscribed
+# to every topic; "summaries" selects periodic_summary messages.
+TOPIC_FIELDS = {
+    "packets": ("new_packets", "packets"),
+    "metrics": ("metrics", "packets_Per_Second", "ip_composition", "encryption_composition"),
+    "protocols": (
+        "tcp_metrics", "rtp_metrics", "quic_metrics", "udp_metrics", "dns_metrics",
+        "igmp_metrics", "ipv4_metrics", "ipv6_metrics",
+    ),
+    "geo": ("new_geolocations",),
+    "top_talkers": ("top_talkers",),
+    "summaries": (),
+}
+ALL_TOPICS = frozenset(TOPIC_FIELDS)
+FIELD_TOPICS = {name: topic for topic, names in TOPIC_FIELDS.items() for name in names}
+
+
+def subscribed_fields(topics, field_names):
+    """Fields of a message that a topic set receives (fields without a topic always)"""
+    return [
+        name for name in field_names
+        if name not in FIELD_TOPICS or FIELD_TOPICS[name] in topics
+    ]
+
+
+def subscribed_topics():
+    """Topics at least one connected client subscribed to"""
+    topics = set()
+    for client in shared_state.connected_clients.values():
+        topics |= client["topics"]
+    return topics
+
+
+def unfiltered_packet_clients():
+    """True when some client receives the packets topic without a display filter"""
+    return any(
+        "packets" in client["topics"] and client["packet_filter"] is None
+        for client in shared_state.connected_clients.values()
+    )
+
+
+def current_state_fields(field_names):
+    """
+    Requested fields of the dashboard state shared by update and initial_state
+    messages. The window's packet display rows are only built when requested.
+    """
+    fields = {
+        "metrics": shared_state.metrics_state,
+        "packets_Per_Second": shared_state.packets_Per_Second,
+        "tcp_metrics": shared_state.tcp_metrics,
+        "rtp_metrics": shared_state.rtp_metrics,
+        "quic_metrics": shared_state.quic_metrics,
+        "udp_metrics": shared_state.udp_metrics,
+        "dns_metrics": shared_state.dns_metrics,
+        "igmp_metrics": shared_state.igmp_metrics,
+        "ipv4_metrics": shared_state.ipv4_metrics,
+        "ipv6_metrics": shared_state.ipv6_metrics,
+        "ip_composition": shared_state.ip_composition,
+        "encryption_composition": shared_state.encryption_composition,
+        "top_talkers": shared_state.top_talkers_top_n,
+    }
+    if "new_packets" in field_names:
+        fields["new_packets"] = shared_state.packet_batch.display_rows()
+    return {name: fields[name] for name in field_names if name in fields}
+
+
+def encode_fields(fields):
+    """JSON-encode each top-level field once, dict fields key by key so they can be diffed"""
+    encoded = {}
+    for name, value in fields.items():
+        if isinstance(value, dict):
+            encoded[name] = {str(key): json.dumps(item) for key, item in value.items()}
+        else:
+            encoded[name] = json.dumps(value)
+    return encoded
+
+
+def join_field(encoded):
+    """JSON text of one encoded field"""
+    if isinstance(encoded, dict):
+        return "{" + ", ".join(
+            f"{json.dumps(key)}: {value}" for key, value in encoded.items()
+        ) + "}"
+    return encoded
+
+
+def get_encoded_state(field_names):
+    """
+    Encoded dashboard state of the last tick and the raw values it was encoded
+    from, encoding the requested fields it lacks from the current state.
+    Re-encoding an emptied state is a new version, so every client needs a
+    snapshot again.
+    """
+    if not shared_state.encoded_state:
+        shared_state.encoded_values = {}
+        shared_state.update_seq += 1
+        for client in shared_state.connected_clients.values():
+            client["channel"].needs_snapshot = True
+
+    missing = [name for name in field_names if name not in shared_state.encoded_state]
+    if missing:
+        fields = current_state_fields(missing)
+        shared_state.encoded_state.update(encode_fields(fields))
+        shared_state.encoded_values.update(fields)
+    return shared_state.encoded_state, shared_state.encoded_values
+
+
+def build_frame(message_type, encoded_fields, field_names, header=None):
+    """Assemble one JSON message from already encoded fields, as UTF-8 bytes"""
+    parts = [f'"type": {json.dumps(message_type)}']
+    if header:
+        parts.extend(f'"{name}": {json.dumps(value)}' for name, value in header.items())
+    parts.extend(f'"{name}": {join_field(encoded_fields[name])}' for name in field_names)
+    return ("{" + ", ".join(parts) + "}").encode("utf-8")
+
+
+def diff_fields(previous, current, field_names):
+    """
+    What changed since the previous tick: names of fields replaced whole, changed
+    keys of dict fields ("patch") and their deleted keys ("removed").
+    """
+    replaced = []
+    patch = {}
+    removed = {}
+    for name in field_names:
+        if name in EVENT_FIELDS:
+            replaced.append(name)
+            continue
+        new = current[name]
+        old = previous.get(name)
+        if isinstance(new, dict) and isinstance(old, dict):
+            changed = [key for key, value in new.items() if old.get(key) != value]
+            deleted = [key for key in old if key not in new]
+            if changed:
+                patch[name] = changed
+            if deleted:
+                removed[name] = deleted
+        elif new != old:
+            replaced.append(name)
+    return replaced, patch, removed
+
+
+def build_delta_frame(diff, encoded_fields, seq):
+    """JSON update holding only what changed since the previous tick"""
+    replaced, patch, removed = diff
+    fields = {name: encoded_fields[name] for name in replaced}
+    fields["patch"] = {
+        name: join_field({key: encoded_fields[name][key] for key in keys})
+        for name, keys in patch.items()
+    }
+    fields["removed"] = {name: json.dumps(keys) for name, keys in removed.items()}
+    header = {"mode": "delta", "seq": seq, "base_seq": seq - 1}
+    return build_frame("update", fields, list(fields), header)
+
+
+def build_msgpack_delta_frame(diff, values, seq):
+    """MessagePack update holding only what changed since the previous tick"""
+    replaced, patch, removed = diff
+    fields = {name: values[name] for name in replaced}
+    fields["patch"] = {
+        name: {key: value for key, value in values[name].items() if str(key) in keys}
+        for name, keys in patch.items()
+    }
+    fields["removed"] = removed
+    header = {"mode": "delta", "seq": seq, "base_seq": seq - 1}
+    return msgpack_codec.build_frame("update", fields, list(fields), header)
+
+
+def build_client_frame(client, message_type, encoded_fields, values, field_names, header=None):
+    """Message for one client in its encoding: JSON fragments, or raw values packed"""
+    if client["encoding"] == "msgpack":
+        return msgpack_codec.build_frame(message_type, values, field_names, header)
+    return build_frame(message_type, encoded_fields, field_names, header)
+
+
+def encode_message(client, message):
+    """Plain message (command response, summary) in the client's encoding"""
+    if client["encoding"] == "msgpack":
+        return msgpack_codec.pack_message(message)
+    return json.dumps(message)
+
+
+def broadcast_message(message, topic=None):
+    """
+    Queue a message for every connected client (subscribed to the topic) without
+    waiting, encoded once per encoding.
+    """
+    frames = {}
+    for client in list(shared_state.connected_clients.values()):
+        if topic is None or topic in client["topics"]:
+            if client["encoding"] not in frames:
+                frames[client["encoding"]] = encode_message(client, message)
+            client["channel"].enqueue(frames[client["encoding"]], message["type"])
+
+
+def queue_resync_snapshot(client):
+    """Queue a snapshot of the last tick for one client, without re-sending its packets"""
+    field_names = subscribed_fields(client["topics"], UPDATE_FIELDS)
+    encoded_fields, values = get_encoded_state(
+        [name for name in field_names if name not in EVENT_FIELDS]
+    )
+    encoded_fields = dict(encoded_fields, new_packets="[]", new_geolocations="[]")
+    values = dict(values, new_packets=[], new_geolocations=[])
+    header = {"mode": "snapshot", "seq": shared_state.update_seq}
+    client["channel"].enqueue(
+        build_client_frame(client, "update", encoded_fields, values, field_names, header),
+        client_channel.SNAPSHOT_KIND,
+    )
+    client["channel"].needs_snapshot = False
+
+
+def filter_packet_fields(packet_filter, encoded_fields, values):
+    """Copies of this tick's fields whose new_packets holds only the rows matching a filter"""
+    batch = shared_state.packet_batch
+    matching = batch.display_rows(packet_filter.matching_rows(batch))
+    encoded_fields = dict(encoded_fields, new_packets=json.dumps(matching))
+    values = dict(values, new_packets=matching)
+    return encoded_fields, values
+
+
+def broadcast_update(previous, encoded_fields, values):
+    """
+    Queue this tick's update for every client: the delta frame of its topics, or
+    their snapshot frame when it has no delta base. Clients with the same topics,
+    encoding and packet filter share frames, and each frame is built at most once.
+    """
+    seq = shared_state.update_seq
+    diffs = {}
+    frames = {}
+    filtered = {}
+
+    def frames_for(topics, encoding, packet_filter):
+        """Delta frame and snapshot builder of one topic set, encoding and packet filter"""
+        filter_text = packet_filter.text if packet_filter else None
+        key = (topics, encoding, filter_text)
+        if key not in frames:
+            field_names = subscribed_fields(topics, UPDATE_FIELDS)
+            tick_fields, tick_values = encoded_fields, values
+            if filter_text is not None and "new_packets" in field_names:
+                # Each distinct filter runs once per tick
+                if filter_text not in filtered:
+                    filtered[filter_text] = filter_packet_fields(
+                        packet_filter, encoded_fields, values
+                    )
+                tick_fields, tick_values = filtered[filter_text]
+            snapshot = []
+
+            def build_snapshot():
+                if not snapshot:
+                    header = {"mode": "snapshot", "seq": seq}
+                    if encoding == "msgpack":
+                        frame = msgpack_codec.build_frame("update", tick_values, field_names, header)
+                    else:
+                        frame = build_frame("update", tick_fields, field_names, header)
+                    snapshot.append(frame)
+                return snapshot[0]
+
+            delta_frame = None
+            if previous:
+                if topics not in diffs:
+                    diffs[topics] = diff_fields(previous, encoded_fields, field_names)
+                if encoding == "msgpack":
+                    delta_frame = build_msgpack_delta_frame(diffs[topics], tick_values, seq)
+                else:
+                    delta_frame = build_delta_frame(diffs[topics], tick_fields, seq)
+            frames[key] = (delta_frame, build_snapshot)
+        return frames[key]
+
+    for client in list(shared_state.connected_clients.values()):
+        delta_frame, build_snapshot = frames_for(
+            client["topics"], client["encoding"], client["packet_filter"]
+        )
+        client["channel"].enqueue_update(delta_frame, build_snapshot)
+
+
+def handle_subscription(client, command, data):
+    """
+    Add (subscribe) or remove (unsubscribe) topics of one client. A "filter"
+    display filter expression given with subscribe limits the packets topic to
+    matching rows; an empty filter (or unsubscribing packets) removes it.
+    """
+    topics = data.get("topics", [])
+    if isinstance(topics, str):
+        topics = [topics]
+    unknown = [topic for topic in topics if topic not in TOPIC_FIELDS]
+
+    if unknown:
+        success, msg = False, f"Unknown topics: {', '.join(map(str, unknown))}"
+    elif command == "subscribe":
+        success, msg = True, f"Subscribed to {', '.join(sorted(topics))}"
+        if "filter" in data:
+            filter_text = str(data["filter"] or "").strip()
+            try:
+                client["packet_filter"] = (
+                    display_filter.DisplayFilter(filter_text) if filter_text else None
+                )
+            except display_filter.FilterError as e:
+                success, msg = False, f"Invalid filter: {e}"
+        if success:
+            added = frozenset(topics) - client["topics"]
+            client["topics"] = client["topics"] | added
+            if added:
+                # No delta base for the new fields yet
+                client["channel"].needs_snapshot = True
+    else:
+        client["topics"] = client["topics"] - frozenset(topics)
+        if "packets" in topics:
+            client["packet_filter"] = None
+        success, msg = True, f"Unsubscribed from {', '.join(sorted(topics))}"
+
+    packet_filter = client["packet_filter"]
+    return {
+        "type": "command_response",
+        "command": command,
+        "success": success,
+        "message": msg,
+        "topics": sorted(client["topics"]),
+        "filter": packet_filter.text if packet_filter else None,
+    }
+
+
+def send_to_client(websocket, message):
+    """Queue a message for one client (ignored when it has disconnected)"""
+    client = shared_state.connected_clients.get(websocket)
+    if client is not None:
+        client["channel"].enqueue(encode_message(client, message), message.get("type", "message"))
+
+
+def requested_encoding(websocket):
+    """Encoding asked for in the connection URL (?encoding=msgpack), JSON by default"""
+    request = getattr(websocket, "request", None)
+    query = parse_qs(urlparse(request.path).query) if request is not None else {}
+    encoding = query.get("encoding", ["json"])[0]
+    if encoding == "msgpack" and msgpack_codec.MSGPACK_AVAILABLE:
+        return "msgpack"
+    if encoding != "json":
+        print(f"Encoding {encoding} is not available, using JSON")
+    return "json"
+
+
 async def data_collection_loop():
     """Continuously collect data and send updates to clients - ASYNC VERSION"""
     while True:
@@ -30,10 +399,12 @@ async def data_collection_loop():
             continue
 
         # ASYNC CAPTURE - This won't block the event loop
-        await capture_manager.capture_packets(shared_state.capture_duration)
+        last_window = await capture_manager.capture_packets(shared_state.capture_duration)
 
         # Check again after capture if clients or not
         if not shared_state.connected_clients:
+            if last_window:
+                await capture_manager.end_replay()
             continue
 
         # Check if capture became inactive *during* the packet capture.
@@ -44,40 +415,34 @@ async def data_collection_loop():
 
         metrics_calculator.calculate_metrics()
 
-        disconnected_clients = set()
-        for client in list(shared_state.connected_clients.keys()):
-            data_to_send = {
-                "type": "update",
-                "metrics": shared_state.metrics_state,
-                "new_packets": shared_state.all_packets_history,
-                "packets_Per_Second": shared_state.packets_Per_Second,
-                "tcp_metrics": shared_state.tcp_metrics,
-                "rtp_metrics": shared_state.rtp_metrics,
-                "quic_metrics": shared_state.quic_metrics,
-                "udp_metrics": shared_state.udp_metrics,
-                "dns_metrics": shared_state.dns_metrics,
-                "igmp_metrics": shared_state.igmp_metrics,
-                "ipv4_metrics": shared_state.ipv4_metrics,
-                "ipv6_metrics": shared_state.ipv6_metrics,
-                "ip_composition": shared_state.ip_composition,
-                "encryption_composition": shared_state.encryption_composition,
-                "top_talkers": shared_state.top_talkers_top7,
-                "new_geolocations": shared_state.new_geolocations
-            }
-
-            try:
-                await client.send(json.dumps(data_to_send))
-            except websockets.exceptions.ConnectionClosed:
-                disconnected_clients.add(client)
+        # Encode the tick once and send the same bytes to every client.
+        # The encoded state is the next delta base and the initial_state of new clients.
+        # Only the fields some client subscribed to are encoded, and the window's
+        # packet rows only when some client takes them unfiltered.
+        previous = shared_state.encoded_state
+        field_names = subscribed_fields(subscribed_topics(), UPDATE_FIELDS)
+        if not unfiltered_packet_clients():
+            field_names = [name for name in field_names if name != "new_packets"]
+        fields = current_state_fields(field_names)
+        shared_state.encoded_state = encode_fields(fields)
+        shared_state.encoded_values = dict(fields)
+        shared_state.update_seq += 1
+        encoded_fields = dict(shared_state.encoded_state)
+        encoded_fields["new_geolocations"] = json.dumps(shared_state.new_geolocations)
+        fields["new_geolocations"] = shared_state.new_geolocations
+
+        # Each client's writer task sends it, a slow client never stalls the capture
+        broadcast_update(previous, encoded_fields, fields)
 
         # Clear new geolocations after sending
         shared_state.new_geolocations = []
 
-        if disconnected_clients:
-            for client in disconnected_clients:
-                if client in shared_state.connected_clients:
-                    del shared_state.connected_clients[client]
-            print(f"Cleaned up {len(disconnected_clients)} disconnected clients.")
+        if last_window:
+            # The replayed file is fully processed: stop the session and
+            # send every client the final state with its "stopped" status
+            await capture_manager.end_replay()
+            for client in list(shared_state.connected_clients.values()):
+                queue_resync_snapshot(client)
 
 
 async def periodic_summary_loop():
@@ -119,24 +484,12 @@ async def periodic_summary_loop():
                 # Generate the periodic summary
                 summary = await llm_summarizer.generate_periodic_summary()
 
-                # Send to all connected clients
-                disconnected_clients = set()
-                for client in list(shared_state.connected_clients.keys()):
-                    data_to_send = {
-                        "type": "periodic_summary",
-                        "summary": summary
-                    }
-
-                    try:
-                        await client.send(json.dumps(data_to_send))
-                    except websockets.exceptions.ConnectionClosed:
-                        disconnected_clients.add(client)
-
-                # Clean up disconnected clients
-                if disconnected_clients:
-                    for client in disconnected_clients:
-                        if client in shared_state.connected_clients:
-                            del shared_state.connected_clients[client]
+                # Queue for all connected clients
+                data_to_send = {
+                    "type": "periodic_summary",
+                    "summary": summary
+                }
+                broadcast_message(data_to_send, "summaries")
 
                 # Update the last summary time
                 shared_state.last_periodic_summary_time = datetime.now()
@@ -147,7 +500,6 @@ async def periodic_summary_loop():
                 RuntimeError,
                 ValueError,
                 TypeError,
-                websockets.exceptions.ConnectionClosed,
             ) as e:
                 print(f"Error generating periodic summary: {e}")
 
@@ -214,11 +566,10 @@ async def handle_stop_capture_task(websocket, data):
     if summary:
         response["summary"] = summary
 
-    # 6. Send the final response to the client
+    # 6. Queue the final response for the client
     try:
-        await websocket.send(json.dumps(response))
+        send_to_client(websocket, response)
     except (
-        websockets.exceptions.ConnectionClosed,
         TypeError,
         ValueError,
     ) as e:
@@ -231,7 +582,12 @@ async def handle_stop_capture_task(websocket, data):
 async def handle_command(command, data):
     """Handles commands that are fast and can be awaited directly."""
     if command == "get_interfaces":
-        interfaces = capture_manager.get_network_interfaces()
+        # "refresh": true re-reads the list now (e.g. after plugging in an adapter)
+        if data.get("refresh"):
+            capture_manager.invalidate_interfaces()
+            interfaces = await capture_manager.refresh_interfaces()
+        else:
+            interfaces = await capture_manager.get_cached_interfaces()
         return {"type": "interfaces_response", "interfaces": interfaces}
 
     if command == "start_capture":
@@ -250,10 +606,18 @@ async def handle_command(command, data):
             success, msg = False, "Tshark already running"
         else:
             capture_manager.clear_all_packets()
-            interface = data.get("interface", "1")
             shared_state.session_start_time = datetime.now()
             shared_state.last_periodic_summary_time = None
-            success, msg = await capture_manager.start_tshark(interface)
+
+            # Optional offline source: replay a pcap/pcapng instead of a live interface
+            pcap_file = data.get("pcap_file")
+            if pcap_file:
+                success, msg = await capture_manager.start_replay(
+                    pcap_file, paced=bool(data.get("paced", False))
+                )
+            else:
+                interface = data.get("interface", "1")
+                success, msg = await capture_manager.start_tshark(interface)
             if success:
                 metrics_calculator.update_metrics_status("running")
             return {
@@ -266,6 +630,160 @@ async def handle_command(command, data):
     if command == "get_status":
         return {"type": "status_response", "metrics": shared_state.metrics_state}
 
+    if command == "get_flows":
+        try:
+            limit = int(data.get("limit", 100))
+        except (TypeError, ValueError):
+            limit = 100
+        return {
+            "type": "flows_response",
+            "flows": shared_state.flow_table.recent_flows(limit),
+            "total_flows": len(shared_state.flow_table),
+        }
+
+    if command == "get_dns_names":
+        # Passive DNS: names of given IPs, or the latest answers (optionally by name)
+        ips = data.get("ips", data.get("ip"))
+        if isinstance(ips, str):
+            ips = [ips]
+        try:
+            limit = int(data.get("limit", 100))
+        except (TypeError, ValueError):
+            limit = 100
+        passive_dns = shared_state.passive_dns
+        return {
+            "type": "dns_names_response",
+            "entries": passive_dns.entries(ips=ips, name=data.get("name"), limit=limit),
+            "total_entries": len(passive_dns),
+            "answers_seen": passive_dns.answers,
+        }
+
+    if command == "get_packets":
+        # Page through the retained history by frame number or time range
+        try:
+            query = {
+                name: (int(data[name]) if name.endswith("frame") else float(data[name]))
+                for name in ("after_frame", "before_frame", "start_time", "end_time")
+                if data.get(name) is not None
+            }
+            limit = int(data.get("limit", 100))
+        except (TypeError, ValueError) as e:
+            return {"type": "error", "message": f"Invalid get_packets query: {e}"}
+        history = shared_state.packet_history
+        packets, has_more = history.page(limit=limit, **query)
+        return {
+            "type": "packets_response",
+            "packets": packets,
+            "has_more": has_more,
+            "oldest_frame": history.oldest_frame(),
+            "newest_frame": history.newest_frame(),
+            "retained": len(history),
+        }
+
+    if command == "query_packets":
+        # Indexed search of the retained history by ip / src / dst / port / protocol / app
+        try:
+            query = {
+                name: str(data[name]) for name in ("ip", "src", "dst", "app")
+                if data.get(name) is not None
+            }
+            if data.get("port") is not None:
+                query["port"] = int(data["port"])
+            if data.get("protocol") is not None:
+                protocol = str(data["protocol"])
+                categories = {name.upper(): name for name in shared_state.protocol_distribution}
+                query["protocol"] = categories.get(protocol.upper(), protocol)
+            for name in ("after_frame", "before_frame"):
+                if data.get(name) is not None:
+                    query[name] = int(data[name])
+            limit = int(data.get("limit", 100))
+        except (TypeError, ValueError) as e:
+            return {"type": "error", "message": f"Invalid query_packets query: {e}"}
+        packets, has_more = shared_state.packet_history.query(limit=limit, **query)
+        return {
+            "type": "query_response",
+            "query": query,
+            "packets": packets,
+            "has_more": has_more,
+            "retained": len(shared_state.packet_history),
+        }
+
+    if command == "set_top_talkers_limit":
+        try:
+            limit = int(data.get("limit", 7))
+        except (TypeError, ValueError):
+            limit = 0
+        if 1 <= limit <= shared_state.top_talkers_capacity:
+            shared_state.top_talkers_limit = limit
+            metrics_calculator.calculate_top_talkers()
+            shared_state.encoded_state = {}
+            success, msg = True, f"Showing top {limit} talkers"
+        else:
+            success = False
+            msg = f"Top talkers limit must be between 1 and {shared_state.top_talkers_capacity}"
+        return {
+            "type": "command_response",
+            "command": "set_top_talkers_limit",
+            "success": success,
+            "message": msg,
+        }
+
+    if command == "set_metrics_engine":
+        engine = data.get("engine", "incremental")
+        if engine not in ("incremental", "python", "numpy", "verify"):
+            success, msg = False, f"Unknown metrics engine: {engine}"
+        elif engine == "numpy" and not metrics_vectorized.NUMPY_AVAILABLE:
+            success, msg = False, "NumPy is not installed, keeping the current engine"
+        else:
+            shared_state.metrics_engine = engine
+            success, msg = True, f"Metrics engine set to {engine}"
+        return {
+            "type": "command_response",
+            "command": "set_metrics_engine",
+            "success": success,
+            "message": msg,
+        }
+
+    if command == "get_client_stats":
+        return {
+            "type": "client_stats_response",
+            "clients": [
+                client["channel"].stats()
+                for client in shared_state.connected_clients.values()
+            ],
+        }
+
+    if command == "get_cache_stats":
+        return {
+            "type": "cache_stats_response",
+            **app_detector.cache_stats(),
+            "flow_app_labels": shared_state.flow_table.app_stats(),
+        }
+
+    if command == "set_client_queue_policy":
+        policy = data.get("policy", shared_state.client_queue_policy)
+        try:
+            size = int(data.get("size", shared_state.client_queue_size))
+        except (TypeError, ValueError):
+            size = 0
+        if policy not in client_channel.FULL_QUEUE_POLICIES:
+            success, msg = False, f"Unknown queue policy: {policy}"
+        elif size < 1:
+            success, msg = False, "Queue size must be at least 1"
+        else:
+            shared_state.client_queue_policy = policy
+            shared_state.client_queue_size = size
+            for client in shared_state.connected_clients.values():
+                client["channel"].policy = policy
+                client["channel"].max_size = size
+            success, msg = True, f"Client queues set to {size} frames, policy {policy}"
+        return {
+            "type": "command_response",
+            "command": "set_client_queue_policy",
+            "success": success,
+            "message": msg,
+        }
+
     return {"type": "error", "message": f"Unknown command: {command}"}
 
 async def websocket_handler(websocket):
@@ -277,30 +795,46 @@ async def websocket_handler(websocket):
             print(f"Client {client_id} waiting - system is resetting...")
             await asyncio.sleep(0.1)
 
-        shared_state.connected_clients[websocket] = {"connected_at": datetime.now().isoformat()}
+        # Before registering, so no update reaches the client ahead of initial_state
+        interfaces = await capture_manager.get_cached_interfaces()
+
+        encoding = requested_encoding(websocket)
+        channel = client_channel.ClientChannel(
+            websocket, shared_state.client_queue_size, shared_state.client_queue_policy,
+            text=encoding == "json",
+        )
+        channel.start()
+        client = {
+            "connected_at": datetime.now().isoformat(),
+            "channel": channel,
+            "topics": ALL_TOPICS,
+            "encoding": encoding,
+            "packet_filter": None,
+        }
+        shared_state.connected_clients[websocket] = client
         print(f"Client {client_id} connected. Total clients: {len(shared_state.connected_clients)}")
 
-        interfaces = capture_manager.get_network_interfaces()
-        initial_data = {
-            "type": "initial_state",
-            "metrics": shared_state.metrics_state,
-            "packets": shared_state.all_packets_history,
-            "interfaces": interfaces,
-            "new_packets": shared_state.all_packets_history,
-            "packets_Per_Second": shared_state.packets_Per_Second,
-            "tcp_metrics": shared_state.tcp_metrics,
-            "rtp_metrics": shared_state.rtp_metrics,
-            "quic_metrics": shared_state.quic_metrics,
-            "udp_metrics": shared_state.udp_metrics,
-            "dns_metrics": shared_state.dns_metrics,
-            "igmp_metrics": shared_state.igmp_metrics,
-            "ipv4_metrics": shared_state.ipv4_metrics,
-            "ipv6_metrics": shared_state.ipv6_metrics,
-            "ip_composition": shared_state.ip_composition,
-            "encryption_composition": shared_state.encryption_composition,
-            "top_talkers": shared_state.top_talkers_top7
-        }
-        await websocket.send(json.dumps(initial_data))
+        # Reuse the fields encoded for the last update, only the interface list is new
+        field_names = subscribed_fields(client["topics"], INITIAL_STATE_FIELDS)
+        if "packets" in field_names:
+            encoded_fields, values = get_encoded_state(field_names + ["new_packets"])
+            encoded_fields = dict(encoded_fields, packets=encoded_fields["new_packets"])
+            values = dict(values, packets=values["new_packets"])
+        else:
+            encoded_fields, values = get_encoded_state(field_names)
+            encoded_fields, values = dict(encoded_fields), dict(values)
+        encoded_fields["interfaces"] = json.dumps(interfaces)
+        values["interfaces"] = interfaces
+        if encoding == "msgpack":
+            channel.enqueue(msgpack_codec.schema_frame(), "schema")
+        header = {"seq": shared_state.update_seq, "encoding": encoding}
+        channel.enqueue(
+            build_client_frame(
+                client, "initial_state", encoded_fields, values, field_names, header
+            ),
+            "initial_state",
+        )
+        channel.needs_snapshot = False
 
         async for message in websocket:
             data = json.loads(message)
@@ -312,18 +846,25 @@ async def websocket_handler(websocket):
 
                 # 2. Send an *immediate* "Tshark stopped" response
                 #    This is for the 1.5s popup.
-                await websocket.send(json.dumps({
+                send_to_client(websocket, {
                     "type": "command_response",
                     "command": "stop_capture_ack",
                     "success": True,
                     "message": "Tshark stopped successfully"
-                }))
+                })
+
+            elif command == "resync":
+                # Client lost track of the delta chain: send the current state whole
+                queue_resync_snapshot(client)
+
+            elif command in ("subscribe", "unsubscribe"):
+                send_to_client(websocket, handle_subscription(client, command, data))
 
             elif command:
                 # All other commands are fast and can be awaited
                 response = await handle_command(command, data)
                 if response:
-                    await websocket.send(json.dumps(response))
+                    send_to_client(websocket, response)
 
     except (
         websockets.exceptions.ConnectionClosed,
@@ -335,8 +876,9 @@ async def websocket_handler(websocket):
         print(f"Exception: {e}")
 
     finally:
-        if websocket in shared_state.connected_clients:
-            del shared_state.connected_clients[websocket]
+        client = shared_state.connected_clients.pop(websocket, None)
+        if client is not None:
+            client["channel"].stop()
 
         remaining = len(shared_state.connected_clients)
         print(f"Client {client_id} session ended. Total clients: {remaining}")
@@ -369,6 +911,7 @@ async def start_websocket_server():
     asyncio.create_task(data_collection_loop())
     asyncio.create_task(geolocation_handler.geolocation_loop())
     asyncio.create_task(periodic_summary_loop())
+    asyncio.create_task(capture_manager.interface_watch_loop())
 
     server = await websockets.serve(
         websocket_handler,
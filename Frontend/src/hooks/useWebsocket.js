@@ -16,6 +16,9 @@ export default function useWebSocket(url) {
   const [protocolDistribution, setProtocolDistribution] = useState({});
   const ws = useRef(null);
 
+  // Versioned updates: last full update (snapshot + merged deltas) and its sequence number
+  const updateState = useRef({ seq: null, fields: {}, resyncPending: false });
+
   // Protocol Specific Metrics
   const [tcpMetrics, setTcpMetrics] = useState(null);
   const [rtpMetrics, setRtpMetrics] = useState(null);
@@ -72,8 +75,41 @@ export default function useWebSocket(url) {
 
   useEffect(() => {
     let isInitialized = false;
+    updateState.current = { seq: null, fields: {}, resyncPending: false };
     ws.current = new WebSocket(url);
 
+    // Merge a delta update into the last full update. Returns null (and asks for a resync) on a sequence gap.
+    const applyUpdate = (msg) => {
+      const state = updateState.current;
+      if (msg.mode !== "delta") {
+        state.seq = msg.seq ?? null;
+        state.fields = msg;
+        state.resyncPending = false;
+        return msg;
+      }
+      if (state.seq === null || msg.base_seq !== state.seq) {
+        if (!state.resyncPending && ws.current?.readyState === WebSocket.OPEN) {
+          console.warn(`Update gap (have ${state.seq}, delta base ${msg.base_seq}), requesting resync`);
+          ws.current.send(JSON.stringify({ command: "resync" }));
+          state.resyncPending = true;
+        }
+        state.seq = null;
+        return null;
+      }
+      const { patch = {}, removed = {}, ...replaced } = msg;
+      const merged = { ...state.fields, ...replaced };
+      for (const [name, keys] of Object.entries(patch)) {
+        merged[name] = { ...(merged[name] || {}), ...keys };
+      }
+      for (const [name, keys] of Object.entries(removed)) {
+        merged[name] = { ...(merged[name] || {}) };
+        keys.forEach(key => delete merged[name][key]);
+      }
+      state.seq = msg.seq;
+      state.fields = merged;
+      return merged;
+    };
+
     ws.current.onopen = () => {
       console.log('WebSocket CONNECTED - Waiting for initial_state');
       setWsConnected(true);
@@ -96,7 +132,11 @@ export default function useWebSocket(url) {
 
     ws.current.onmessage = ({ data }) => {
       try {
-        const msg = JSON.parse(data);
+        let msg = JSON.parse(data);
+        if (msg.type === 'initial_state' || msg.type === 'update') {
+          msg = applyUpdate(msg);
+          if (!msg) return;
+        }
         setError(null);
 
         // Initialization checks